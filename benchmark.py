@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import io
+import json
+import array
+import time
+import random
+import shutil
+import platform
+import tempfile
+import threading
+import contextlib
+import tracemalloc
+import subprocess
+
+import records
+import segmented_log
+import live_statistics
+import log_collector
+
+""" Benchmarks for the input, logging and analysis hot paths
+
+    Every benchmark reports the median time per operation over several runs. Results are stored as json
+    (by default in benchmark_results/<commit>.json) and can be compared with an earlier run; the comparison
+    fails if any benchmark got slower than the threshold allows.
+
+    The ".allocations" benchmarks report the median memory peak of a single call and the memory blocks still
+    allocated afterwards (tracemalloc) instead of the time.
+
+    Benchmarks that need PyQt5 or pandas are reported as skipped if these are not installed. A comparison
+    also fails if a benchmark of the earlier run was skipped or is missing, unless --allow-missing is given.
+
+    usage: benchmark.py [--filter <text>] [--max-trials <n>] [--output <file>]
+                        [--compare <earlier results.json>] [--threshold <percent>] [--allow-missing]
+"""
+
+RESULTS_DIRECTORY = "benchmark_results"
+# separate runs of the same commit differ by up to ~25 % on a busy or single-core machine; use a lower
+# threshold only on a quiet machine
+DEFAULT_THRESHOLD = 25.0
+MIN_RUN_SECONDS = 0.2
+REPEAT = 9
+TRIAL_COUNTS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DEFAULT_MAX_TRIALS = 10 ** 6
+DICTIONARY_SIZES = [10, 1000, 100000]
+REPETITION_COUNTS = [10, 1000, 10000]
+# "collector" and "live_stats" are measured on top of the csv-files, as they are used in the experiment
+LOGGER_SINKS = ["none", "stdout", "file", "segmented", "collector", "live_stats"]
+
+# the figure of a result that is compared with an earlier run, for timed and for ".allocations" benchmarks
+METRICS = ["seconds_per_op", "peak_bytes_per_op"]
+# registered benchmarks: (name, parameter values, function creating the callable for a parameter)
+BENCHMARKS = []
+
+
+class Skipped(Exception):
+    """
+        Raised by a benchmark setup if a dependency is missing
+    """
+    pass
+
+
+def benchmark(name, params=(None,)):
+    """
+        Registers a benchmark; the decorated function gets a parameter and returns (callable, operations per call)
+    """
+    def register(setup):
+        BENCHMARKS.append((name, list(params), setup))
+        return setup
+    return register
+
+
+def import_qt():
+    """
+        Imports the Qt-based modules and makes sure a QApplication exists
+
+        @return: Tuple of the QtCore, QtGui, text_input_technique and text_entry_speed_test modules
+    """
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5 import QtCore, QtGui, QtWidgets
+        import text_input_technique
+        import text_entry_speed_test
+    except ImportError:
+        raise Skipped("PyQt5 is not installed")
+    if QtWidgets.QApplication.instance() is None:
+        import_qt.app = QtWidgets.QApplication(["benchmark"])
+    return QtCore, QtGui, text_input_technique, text_entry_speed_test
+
+
+class KeyEventFixture(object):
+    """
+        Key event as the filters see it for real keyboard input; events created in Python are never spontaneous
+    """
+
+    __slots__ = ("event_type", "event_key", "event_text")
+
+    def __init__(self, event_type, key, text):
+        self.event_type = event_type
+        self.event_key = key
+        self.event_text = text
+
+    def spontaneous(self):
+        return True
+
+    def type(self):
+        return self.event_type
+
+    def key(self):
+        return self.event_key
+
+    def text(self):
+        return self.event_text
+
+    def isAutoRepeat(self):
+        return False
+
+
+def random_chords(size, seed=1):
+    """
+        Creates a chord dictionary of the given size with random key sets of two to six letters
+    """
+    generator = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyzäöüß"
+    chords = {}
+    while len(chords) < size:
+        keys = frozenset(generator.sample(letters, generator.randint(2, 6)))
+        chords[keys] = "".join(sorted(keys))
+    return chords
+
+
+@benchmark("StandardInputMethod.eventFilter")
+def bench_event_filter(_):
+    QtCore, QtGui, text_input_technique, _ = import_qt()
+    method = text_input_technique.StandardInputMethod()
+    target = QtCore.QObject()
+    events = []
+    for letter, key in (("d", QtCore.Qt.Key_D), ("a", QtCore.Qt.Key_A), ("s", QtCore.Qt.Key_S)):
+        events.append(KeyEventFixture(QtCore.QEvent.KeyPress, key, letter))
+        events.append(KeyEventFixture(QtCore.QEvent.KeyRelease, key, letter))
+
+    def run():
+        for event in events:
+            method.eventFilter(target, event)
+        QtCore.QCoreApplication.removePostedEvents(target)
+    return run, len(events)
+
+
+@benchmark("ChordInputMethod.get_word", DICTIONARY_SIZES)
+def bench_get_word(size):
+    _, _, text_input_technique, _ = import_qt()
+    method = text_input_technique.ChordInputMethod()
+    method.chords = random_chords(size)
+    hits = [sorted(keys) for keys in list(method.chords)[:50]]
+    misses = [["q", "x"], ["y", "ä", "j", "v", "c", "k", "p"]] * 25
+    key_lists = hits + misses
+
+    def run():
+        for keys in key_lists:
+            method.keys = keys
+            method.get_word()
+    return run, len(key_lists)
+
+
+@contextlib.contextmanager
+def logger_sink(sink, directory):
+    """
+        Creates a TestLogger writing to the given sink inside directory and cleans up afterwards
+    """
+    _, _, _, text_entry_speed_test = import_qt()
+    collector = server = None
+    arguments = {}
+    if sink == "segmented":
+        arguments["segments"] = segmented_log.SegmentedLogWriter(os.path.join(directory, "logs"))
+    elif sink == "collector":
+        collector = log_collector.LogCollector(os.path.join(directory, "collected"))
+        server = threading.Thread(target=collector.run, args=("127.0.0.1", 0), daemon=True)
+        server.start()
+        collector.started.wait()
+        host, port = collector.server.sockets[0].getsockname()[:2]
+        arguments["collector"] = log_collector.CollectorSink(host, port, os.path.join(directory, "spill.jsonl"),
+                                                             adopt_leftovers=False)
+    elif sink == "live_stats":
+        arguments["live_stats"] = live_statistics.LiveStatistics(os.path.join(directory, "live.json"))
+    log_to_file = sink in ("file", "segmented", "collector", "live_stats")
+    working_directory = os.getcwd()
+    os.chdir(directory)  # the csv-files of TestLogger are created in the working directory
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            logger = text_entry_speed_test.TestLogger(1, sink == "stdout", log_to_file, **arguments)
+    finally:
+        os.chdir(working_directory)
+    try:
+        yield logger
+    finally:
+        logger.close()
+        spilled = 0
+        if "collector" in arguments:
+            arguments["collector"].close()
+            spilled = arguments["collector"].spilled
+        if "segments" in arguments:
+            arguments["segments"].close()
+        if collector is not None:
+            collector.stop()
+            server.join()
+        if spilled > 0:
+            # the measurement timed spill file appends instead of socket sends
+            raise RuntimeError("%d records of the collector benchmark were spilled" % spilled)
+
+
+@benchmark("TestLogger.log_event", LOGGER_SINKS)
+def bench_log_event(sink):
+    QtCore, _, _, _ = import_qt()
+    return logger_benchmark(sink, lambda logger: logger.log_event("key_pressed", QtCore.Qt.Key_A, "a"))
+
+
+@benchmark("TestLogger.log_event.allocations", LOGGER_SINKS)
+def bench_log_event_allocations(sink):
+    run, calls = bench_log_event(sink)
+    run.measure = measure_allocations
+    return run, calls
+
+
+@benchmark("TestLogger.log_stats", LOGGER_SINKS)
+def bench_log_stats(sink):
+    _, _, _, text_entry_speed_test = import_qt()
+    trial = text_entry_speed_test.Trial("C", "der hat nen Hut aber ich nicht")
+    return logger_benchmark(sink, lambda logger: logger.log_stats(trial, "der hat nen Hut bre ich nicht",
+                                                                  11909, 30.229238391132757))
+
+
+def logger_benchmark(sink, log):
+    """
+        Wraps a single logger call into a benchmark callable that keeps its sink open between runs
+    """
+    directory = os.path.realpath(tempfile.mkdtemp(prefix="benchmark_"))
+    context = logger_sink(sink, directory)
+    logger = context.__enter__()
+    if logger.collector is not None and os.path.dirname(logger.collector.spill_filename) != directory:
+        raise RuntimeError("spill file outside of the benchmark directory: %s" % logger.collector.spill_filename)
+    devnull = open(os.devnull, "w")
+    calls = 100
+
+    def settle():
+        if logger.collector is not None:
+            # include the sending in the measurement and never let the queue overflow into the spill file
+            while not logger.collector.pending.empty():
+                time.sleep(0)
+
+    def run():
+        with contextlib.redirect_stdout(devnull):
+            for _ in range(calls):
+                log(logger)
+        settle()
+
+    def traced():
+        peaks = array.array("q", bytes(8 * calls))  # allocated up front, so storing a peak allocates nothing
+        with contextlib.redirect_stdout(devnull):
+            for call in range(calls):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                log(logger)
+                peaks[call] = tracemalloc.get_traced_memory()[1] - before
+        settle()
+        return peaks
+
+    def cleanup():
+        context.__exit__(None, None, None)
+        devnull.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    run.cleanup = cleanup
+    run.traced = traced
+    return run, calls
+
+
+@benchmark("Trial.create_list_from_conditions", REPETITION_COUNTS)
+def bench_create_trials(repetitions):
+    _, _, _, text_entry_speed_test = import_qt()
+    return (lambda: text_entry_speed_test.Trial.create_list_from_conditions(["S", "C"], repetitions)), 1
+
+
+def synthetic_stats(filename, trials, seed=1):
+    """
+        Writes a stats csv-file with the given number of synthetic trials in the format of TestLogger
+    """
+    generator = random.Random(seed)
+    sentences = ["der hat nen Hut aber ich nicht", "ich hab den Bus verpasst", "wo rennst du bloß rein"]
+    with open(filename, "w", encoding="utf-8", newline="") as stats_file:
+        stats_file.write(";".join('"%s"' % field for field in records.STATS_FIELDS) + "\n")
+        lines = []
+        for i in range(trials):
+            sentence = sentences[i % len(sentences)]
+            total_time = generator.randint(4000, 20000)
+            lines.append('"%d";"%s";"%s";"%s";"%d";"%r";"2017-06-18T15:10:48"\n' % (
+                i % 50 + 1, sentence, sentence, "CS"[i % 2], total_time, len(sentence) * 12000.0 / total_time))
+            if len(lines) == 10000:
+                stats_file.writelines(lines)
+                lines = []
+        stats_file.writelines(lines)
+
+
+def synthetic_words(filename, words, seed=1):
+    """
+        Writes a word csv-file with the given number of synthetic word records in the format of TestLogger
+    """
+    generator = random.Random(seed)
+    vocabulary = ["der", "hat", "nen", "Hut", "aber", "ich", "nicht", "hab", "den", "Bus", "verpasst", "rennst"]
+    with open(filename, "w", encoding="utf-8", newline="") as word_file:
+        word_file.write(";".join('"%s"' % field for field in records.WORD_FIELDS) + "\n")
+        lines = []
+        for i in range(words):
+            word = vocabulary[i % len(vocabulary)]
+            chorded = i % 3 == 0
+            chord_size = min(len(word), 3) if chorded else 0
+            word_time = generator.randint(300, 900) + (chord_size * 150 if chorded else len(word) * 250)
+            lines.append('"%d";"%s";"%s";"%s";"%d";"%d";"%d";"%d";"2017-06-18T15:10:48"\n' % (
+                i % 50 + 1, word, "CS"[i % 2], "chord" if chorded else "letters", len(word), chord_size,
+                i % 10 == 0, word_time))
+            if len(lines) == 10000:
+                word_file.writelines(lines)
+                lines = []
+        word_file.writelines(lines)
+
+
+def data_file_for(kind, count):
+    """
+        Returns (and caches) a synthetic "stats" or "words" file with the given number of records
+    """
+    cache = data_file_for.__dict__.setdefault("cache", {})
+    if (kind, count) not in cache:
+        directory = data_file_for.__dict__.setdefault("directory", tempfile.mkdtemp(prefix="benchmark_stats_"))
+        cache[(kind, count)] = os.path.join(directory, "%s_%d.csv" % (kind, count))
+        write = synthetic_stats if kind == "stats" else synthetic_words
+        write(cache[(kind, count)], count)
+    return cache[(kind, count)]
+
+
+def import_statistics():
+    """
+        Imports statistics.py (which needs pandas, scipy and matplotlib) without showing any plots
+
+        @return: The statistics module of this repository
+    """
+    try:
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        import statistics
+    except ImportError:
+        raise Skipped("pandas/scipy/matplotlib are not installed")
+    if not hasattr(statistics, "read_stats_data"):
+        raise Skipped("the statistics module of the standard library was imported instead of statistics.py")
+    return statistics
+
+
+@benchmark("statistics.load_and_summarize", TRIAL_COUNTS)
+def bench_statistics(trials):
+    statistics = import_statistics()
+    filename = data_file_for("stats", trials)
+    # the directory does not exist, so the data file is read as without a segmented log
+    directory = os.path.join(os.path.dirname(filename), "no_segmented_log")
+    return (lambda: statistics.summarize_wpm(statistics.read_stats_data(directory, filename))), trials
+
+
+@benchmark("statistics.analyze_word_times", TRIAL_COUNTS)
+def bench_statistics_words(words):
+    statistics = import_statistics()
+    filename = data_file_for("words", words)
+    directory = os.path.join(os.path.dirname(filename), "no_segmented_log")
+
+    def run():
+        statistics.analyze_word_times(statistics.read_word_data(directory, ["C", "S"], filename))
+    return run, words
+
+
+def measure(run, operations):
+    """
+        Calls run often enough for a stable measurement
+
+        @return: Median time per operation in seconds
+    """
+    started = time.perf_counter()
+    run()
+    once = time.perf_counter() - started
+    calls = max(1, int(MIN_RUN_SECONDS / max(once, 1e-9)))
+    repeat = REPEAT if once < 1 else 3
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        times.append((time.perf_counter() - started) / calls)
+    times.sort()
+    return times[len(times) // 2] / operations
+
+
+def measure_allocations(run, operations):
+    """
+        Calls run.traced (which returns the tracemalloc peak of every single operation) under tracemalloc
+
+        @return: Dictionary with the median peak per operation in bytes and the number of memory blocks still
+        allocated per operation afterwards
+    """
+    run()  # warm up, e.g. file buffers and the connection to the collector
+    switch_interval = sys.getswitchinterval()
+    # keep background threads (the collector sink and server) from running inside a measured call
+    sys.setswitchinterval(1.0)
+    tracemalloc.start()
+    try:
+        start_snapshot = tracemalloc.take_snapshot()
+        peaks = array.array("q")
+        for _ in range(REPEAT):
+            peaks.extend(run.traced())
+        retained = sum(stat.count_diff for stat in
+                       tracemalloc.take_snapshot().compare_to(start_snapshot, "filename") if stat.count_diff > 0)
+    finally:
+        tracemalloc.stop()
+        sys.setswitchinterval(switch_interval)
+    peaks = sorted(peaks)
+    return {"peak_bytes_per_op": peaks[len(peaks) // 2], "blocks_per_op": retained / float(len(peaks))}
+
+
+def run_all(name_filter=None, max_trials=DEFAULT_MAX_TRIALS):
+    """
+        Runs all registered benchmarks
+
+        @return: Dictionary "name[parameter]" -> {"seconds_per_op": ...}, {"peak_bytes_per_op": ...,
+        "blocks_per_op": ...} or {"skipped": reason}
+    """
+    results = {}
+    for name, params, setup in BENCHMARKS:
+        for param in params:
+            key = name if param is None else "%s[%s]" % (name, param)
+            if name_filter is not None and name_filter not in key:
+                continue
+            if name.startswith("statistics.") and param > max_trials:
+                continue
+            try:
+                run, operations = setup(param)
+            except Skipped as reason:
+                results[key] = {"skipped": str(reason)}
+                print("%-60s skipped (%s)" % (key, reason))
+                continue
+            try:
+                if hasattr(run, "measure"):
+                    results[key] = run.measure(run, operations)
+                else:
+                    results[key] = {"seconds_per_op": measure(run, operations)}
+            finally:
+                if hasattr(run, "cleanup"):
+                    run.cleanup()
+            if "peak_bytes_per_op" in results[key]:
+                print("%-60s %12d B/op peak, %.2f blocks/op retained"
+                      % (key, results[key]["peak_bytes_per_op"], results[key]["blocks_per_op"]))
+            else:
+                print("%-60s %12.3f us/op" % (key, results[key]["seconds_per_op"] * 1e6))
+    if "directory" in data_file_for.__dict__:
+        shutil.rmtree(data_file_for.directory, ignore_errors=True)
+    return results
+
+
+def compare(results, earlier, threshold):
+    """
+        Prints the change of every benchmark present in both runs and the benchmarks of the earlier run
+        that were skipped or not run this time
+
+        @return: Tuple of the benchmarks that got slower (or allocate more) by more than threshold percent and the
+        missing ones
+    """
+    regressions = []
+    missing = []
+    for key, before in sorted(earlier.items()):
+        metric = next((metric for metric in METRICS if metric in before), None)
+        if metric is None:
+            continue
+        result = results.get(key, {})
+        if metric not in result:
+            print("%-60s %s" % (key, "MISSING (%s)" % result["skipped"] if "skipped" in result else "MISSING"))
+            missing.append(key)
+            continue
+        if result[metric] == before[metric]:
+            change = 0.0  # also for two allocation-free runs
+        else:
+            change = 100.0 * (result[metric] / max(before[metric], 1e-12) - 1)
+        regressed = change > threshold
+        print("%-60s %+8.1f %%%s" % (key, change, "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(key)
+    return regressions, missing
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    args = sys.argv[1:]
+    options = {"--filter": None, "--max-trials": DEFAULT_MAX_TRIALS, "--output": None, "--compare": None,
+               "--threshold": DEFAULT_THRESHOLD}
+    allow_missing = False
+    while args:
+        option = args.pop(0)
+        if option == "--allow-missing":
+            allow_missing = True
+            continue
+        if option not in options or not args:
+            sys.stderr.write("Usage: %s [--filter <text>] [--max-trials <n>] [--output <file>] "
+                             "[--compare <results.json>] [--threshold <percent>] [--allow-missing]\n" % sys.argv[0])
+            sys.exit(1)
+        options[option] = args.pop(0)
+
+    commit = current_commit()
+    results = run_all(options["--filter"], int(options["--max-trials"]))
+    output = options["--output"] or os.path.join(RESULTS_DIRECTORY, "%s.json" % commit)
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump({"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+                   "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, output_file, indent=1)
+    print("results written to %s" % output)
+
+    if options["--compare"] is not None:
+        with open(options["--compare"]) as earlier_file:
+            earlier = json.load(earlier_file)["results"]
+        if options["--filter"] is not None:
+            earlier = dict((key, result) for key, result in earlier.items() if options["--filter"] in key)
+        regressions, missing = compare(results, earlier, float(options["--threshold"]))
+        if regressions:
+            print("%d benchmark(s) slower or allocating more by more than %s %%"
+                  % (len(regressions), options["--threshold"]))
+        if missing:
+            print("%d benchmark(s) of the earlier run skipped or missing%s"
+                  % (len(missing), " (allowed)" if allow_missing else ""))
+        if regressions or (missing and not allow_missing):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import re
+import csv
+import glob
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing
+from collections import Counter
+
+import phrases
+
+""" Data-quality scanner for the experiment logs
+
+    Finds (and with --repair removes or fixes) the known artifacts in stats and event files:
+    - header_duplicates: header rows in the middle of a file, written whenever a file was re-opened in append mode
+    - swapped_rows: stats rows with transcribed_sentence and text_input_technique swapped
+      (the column order of the old stdout format)
+    - training_rows: stats rows of training trials mixed into the test data; a training sentence is counted as
+      training when it occurs more often for a user and technique than the test repeats the sentences
+    - malformed_rows: rows with the wrong number of columns
+
+    Files are scanned in parallel chunks of whole lines. Clean chunks are only counted, never parsed
+    row by row, so the scanner can run as a gate before every analysis.
+
+    usage: data_validation.py [--repair <output directory>] [--report <report.json>] [--processes <n>] [<file> ...]
+           (exits with 1 if unrepaired issues were found)
+"""
+
+DEFAULT_FILES = ["stats_user*.csv", "events_user*.csv", "stats_data.csv", "event_data.csv"]
+CHUNK_BYTES = 16 * 1024 * 1024
+SEPARATOR = b'";"'
+HEADER_START = b'"user_id";'
+STATS_COLUMNS = 7
+EVENT_COLUMNS = 5
+TECHNIQUES = (b"C", b"S")
+TRAINING_SENTENCES = set(sentence.encode("utf-8") for sentence in phrases.TRAINING_SENTENCES)
+# stats rows whose third column holds a technique and whose fourth does not
+SWAPPED_ROW = re.compile(rb'^"([^"\n]*)";"([^"\n]*)";"([CS])";"(?![CS]")([^"\n]*)"', re.M)
+# user, presented sentence and technique of a stats row; anchored on the preceding newline, which is much faster
+# than re.M, so the chunk has to be prefixed with a newline
+STATS_KEY = re.compile(rb'\n"([^"]*)";"([^"]*)";"[^"]*";"([^"]*)";')
+ISSUES = ["header_duplicates", "swapped_rows", "training_rows", "malformed_rows"]
+
+
+def file_kind(filename):
+    """
+        @return: "stats" or "events" depending on the header (or, without header, the name) of a log file
+    """
+    with open(filename, "rb") as logfile:
+        first_line = logfile.readline()
+    if b"presented_sentence" in first_line:
+        return "stats"
+    if b"event_type" in first_line:
+        return "events"
+    return "stats" if os.path.basename(filename).startswith("stats") else "events"
+
+
+def chunk_ranges(filename, chunk_bytes=CHUNK_BYTES):
+    """
+        Splits a file into byte ranges that start and end at line boundaries
+    """
+    size = os.path.getsize(filename)
+    ranges = []
+    with open(filename, "rb") as logfile:
+        start = 0
+        while start < size:
+            logfile.seek(min(start + chunk_bytes, size))
+            logfile.readline()
+            end = min(logfile.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def split_row(line):
+    """
+        Splits a quoted, ";"-separated row; falls back to the csv module for escaped quotes
+    """
+    if b'""' in line:
+        return next(csv.reader([line.decode("utf-8")], delimiter=";"))
+    return [field.decode("utf-8") for field in line.strip(b"\r\n")[1:-1].split(SEPARATOR)]
+
+
+def scan_chunk(task):
+    """
+        Counts the issues of one chunk (runs in a worker process)
+
+        @param task: Tuple of file name, kind, start and end offset
+        @return: Dictionary with the issue counts, the number of rows and, for stats files, the
+                 counts of all (user, sentence, technique)
+    """
+    filename, kind, start, end = task
+    with open(filename, "rb") as logfile:
+        logfile.seek(start)
+        chunk = logfile.read(end - start)
+    columns = STATS_COLUMNS if kind == "stats" else EVENT_COLUMNS
+    result = dict((issue, 0) for issue in ISSUES)
+    result["rows"] = chunk.count(b"\n") + (0 if chunk.endswith(b"\n") or not chunk else 1)
+    result["header_duplicates"] = chunk.count(b"\n" + HEADER_START) + (1 if start > 0 and
+                                                                         chunk.startswith(HEADER_START) else 0)
+    # fast path: if the separators add up, every row has the right number of columns
+    if chunk.count(SEPARATOR) != (columns - 1) * result["rows"]:
+        for line in chunk.splitlines():
+            if line and line.count(SEPARATOR) != columns - 1 and len(split_row(line)) != columns:
+                result["malformed_rows"] += 1
+    if kind == "stats":
+        # counted on the regex matches so that clean rows never reach the interpreter one by one
+        sentences = Counter(match for match in STATS_KEY.findall(b"\n" + chunk) if match[0] != b"user_id")
+        if any(technique not in TECHNIQUES for _, _, technique in sentences):
+            for user_id, sentence, technique, transcribed in SWAPPED_ROW.findall(chunk):
+                result["swapped_rows"] += 1
+                sentences[(user_id, sentence, transcribed)] -= 1
+                sentences[(user_id, sentence, technique)] += 1
+        result["sentences"] = sentences
+    return result
+
+
+def training_surplus(sentences):
+    """
+        Finds out how many training trials are mixed into the test data
+
+        Per user and technique the test presents every sentence equally often; surplus occurrences of training
+        sentences are training trials.
+
+        @param sentences: Counter of (user, sentence, technique)
+        @return: Dictionary (user, sentence, technique) -> number of training rows
+    """
+    repetitions = {}
+    for (user_id, _, technique), count in sentences.items():
+        if count > 0:
+            repetitions.setdefault((user_id, technique), Counter())[count] += 1
+    surplus = {}
+    for (user_id, sentence, technique), count in sentences.items():
+        if count <= 0 or sentence not in TRAINING_SENTENCES:
+            continue
+        expected = repetitions[(user_id, technique)].most_common(1)[0][0]
+        if count > expected:
+            surplus[(user_id, sentence, technique)] = count - expected
+    return surplus
+
+
+def find_rows_chunk(task):
+    """
+        Returns the offsets of all stats rows of a chunk with one of the given keys (runs in a worker process)
+
+        @param task: Tuple of file name, start and end offset and the set of (user, sentence, technique) keys
+        @return: List of (offset, key)
+    """
+    filename, start, end, keys = task
+    with open(filename, "rb") as logfile:
+        logfile.seek(start)
+        chunk = logfile.read(end - start)
+    rows = []
+    for match in STATS_KEY.finditer(b"\n" + chunk):
+        key = match.groups()
+        swapped = SWAPPED_ROW.match(chunk, match.start())
+        if swapped is not None:
+            key = (key[0], key[1], swapped.group(3))
+        if key in keys:
+            rows.append((start + match.start(), key))
+    return rows
+
+
+def find_training_rows(pool, filename, ranges, surplus):
+    """
+        Picks the rows that belong to training trials; as training runs before the test, the earliest rows are picked
+
+        @param ranges: The chunks of the file
+        @param surplus: Result of training_surplus
+        @return: Set of offsets of training rows
+    """
+    if not surplus:
+        return set()
+    keys = set(surplus)
+    remaining = dict(surplus)
+    training = set()
+    for rows in pool.map(find_rows_chunk, [(filename, start, end, keys) for start, end in ranges]):
+        for offset, key in rows:
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                training.add(offset)
+    return training
+
+
+def repair_chunk(task):
+    """
+        Writes the cleaned rows of one chunk to a part file (runs in a worker process)
+
+        @param task: Tuple of file name, kind, start and end offset, offsets of training rows, part file name
+        @return: Tuple of the part file name and the file name for removed training rows (or None)
+    """
+    filename, kind, start, end, training_offsets, part_filename = task
+    columns = STATS_COLUMNS if kind == "stats" else EVENT_COLUMNS
+    with open(filename, "rb") as logfile:
+        logfile.seek(start)
+        chunk = logfile.read(end - start)
+    training_filename = None
+    with open(part_filename, "wb") as part:
+        lines = chunk.splitlines(True)
+        training_lines = []
+        offset = start
+        for line in lines:
+            line_offset = offset
+            offset += len(line)
+            if line.startswith(HEADER_START):
+                if line_offset == 0:
+                    part.write(line)
+                continue
+            if line.count(SEPARATOR) != columns - 1 and len(split_row(line)) != columns:
+                continue
+            if kind == "stats":
+                fields = line.split(SEPARATOR)
+                if fields[2] in TECHNIQUES and fields[3] not in TECHNIQUES:
+                    fields[2], fields[3] = fields[3], fields[2]
+                    line = SEPARATOR.join(fields)
+                if line_offset in training_offsets:
+                    training_lines.append(line)
+                    continue
+            part.write(line)
+    if training_lines:
+        training_filename = part_filename + ".training"
+        with open(training_filename, "wb") as training_part:
+            training_part.writelines(training_lines)
+    return part_filename, training_filename
+
+
+def validate(filenames, repair_directory=None, processes=None):
+    """
+        Scans all files and optionally writes cleaned copies
+
+        @return: Report with per-file and total counts, bytes and seconds
+    """
+    started = time.time()
+    kinds = dict((filename, file_kind(filename)) for filename in filenames)
+    tasks = [(filename, kinds[filename], start, end) for filename in filenames
+             for start, end in chunk_ranges(filename)]
+    report = {"files": {}}
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(scan_chunk, tasks)
+        training = {}
+        for (filename, kind, start, end), result in zip(tasks, results):
+            entry = report["files"].setdefault(filename, dict([("kind", kind), ("rows", 0), ("bytes", 0)] +
+                                                              [(issue, 0) for issue in ISSUES]))
+            entry["bytes"] += end - start
+            for field in ["rows"] + ISSUES:
+                entry[field] += result[field]
+        for filename in filenames:
+            if kinds[filename] == "stats":
+                sentences = Counter()
+                for task, result in zip(tasks, results):
+                    if task[0] == filename:
+                        sentences.update(result["sentences"])
+                ranges = [(start, end) for task_filename, _, start, end in tasks if task_filename == filename]
+                training[filename] = find_training_rows(pool, filename, ranges, training_surplus(sentences))
+                report["files"][filename]["training_rows"] = len(training[filename])
+        if repair_directory is not None:
+            repair(pool, tasks, training, repair_directory)
+    for entry in report["files"].values():
+        entry["rows"] = max(entry["rows"] - 1 - entry["header_duplicates"], 0)  # headers are no data rows
+    report["total"] = dict((field, sum(entry[field] for entry in report["files"].values()))
+                           for field in ["rows", "bytes"] + ISSUES)
+    report["seconds"] = time.time() - started
+    report["repaired_into"] = repair_directory
+    return report
+
+
+def repair(pool, tasks, training, repair_directory):
+    """
+        Rewrites all chunks in parallel and joins the parts into one cleaned file per input file
+
+        Removed training rows are kept in training_<name> next to the cleaned file
+    """
+    os.makedirs(repair_directory, exist_ok=True)
+    part_directory = tempfile.mkdtemp(prefix="validation_", dir=repair_directory)
+    repair_tasks = []
+    for number, (filename, kind, start, end) in enumerate(tasks):
+        offsets = set(offset for offset in training.get(filename, ()) if start <= offset < end)
+        repair_tasks.append((filename, kind, start, end, offsets, os.path.join(part_directory, "%06d" % number)))
+    parts = pool.map(repair_chunk, repair_tasks)
+    outputs = {}
+    for (filename, _, _, _), (part_filename, training_filename) in zip(tasks, parts):
+        outputs.setdefault(filename, []).append((part_filename, training_filename))
+    for filename, file_parts in outputs.items():
+        name = os.path.basename(filename)
+        with open(os.path.join(repair_directory, name), "wb") as cleaned:
+            for part_filename, _ in file_parts:
+                with open(part_filename, "rb") as part:
+                    shutil.copyfileobj(part, cleaned, 1 << 20)
+        training_parts = [training_filename for _, training_filename in file_parts if training_filename]
+        if training_parts:
+            with open(os.path.join(repair_directory, "training_" + name), "wb") as training_file:
+                with open(filename, "rb") as original:
+                    training_file.write(original.readline())  # header
+                for training_filename in training_parts:
+                    with open(training_filename, "rb") as part:
+                        shutil.copyfileobj(part, training_file)
+    shutil.rmtree(part_directory)
+
+
+def print_report(report):
+    """
+        Prints one line per file and the totals
+    """
+    print("%-24s %-6s %9s %8s %8s %8s %8s" % ("file", "kind", "rows", "headers", "swapped", "training",
+                                                "malformed"))
+    for filename, entry in sorted(report["files"].items()):
+        print("%-24s %-6s %9d %8d %8d %8d %8d" % (os.path.basename(filename), entry["kind"], entry["rows"],
+                                                   entry["header_duplicates"], entry["swapped_rows"],
+                                                   entry["training_rows"], entry["malformed_rows"]))
+    total = report["total"]
+    print("%d rows, %d issues in %.1f MB scanned in %.2f s (%.0f MB/s)" % (
+        total["rows"], sum(total[issue] for issue in ISSUES), total["bytes"] / 1e6, report["seconds"],
+        total["bytes"] / 1e6 / max(report["seconds"], 1e-9)))
+    if report["repaired_into"] is not None:
+        print("cleaned files written to %s" % report["repaired_into"])
+
+
+def main():
+    args = sys.argv[1:]
+    repair_directory = report_filename = None
+    processes = None
+    filenames = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--repair":
+            repair_directory = args.pop(0)
+        elif arg == "--report":
+            report_filename = args.pop(0)
+        elif arg == "--processes":
+            processes = int(args.pop(0))
+        else:
+            filenames.append(arg)
+    if not filenames:
+        filenames = sorted(set(name for pattern in DEFAULT_FILES for name in glob.glob(pattern)))
+    if not filenames:
+        sys.stderr.write("No log files found\n")
+        sys.exit(1)
+
+    report = validate(filenames, repair_directory, processes)
+    print_report(report)
+    if report_filename is not None:
+        with open(report_filename, "w") as report_file:
+            json.dump(report, report_file, indent=1)
+    issues = sum(report["total"][issue] for issue in ISSUES)
+    sys.exit(1 if issues > 0 and repair_directory is None else 0)
+
+
+if __name__ == '__main__':
+    main()
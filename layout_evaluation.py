@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import re
+import glob
+import json
+import time
+import random
+import multiprocessing
+from collections import Counter
+
+import chords
+import records
+import segmented_log
+
+""" Offline evaluation of chord layouts against the recorded sessions (no Qt needed)
+
+    A layout maps a set of keys to a word, like chords.CHORDS. Layout files are json objects
+    mapping words to the keys of their chord, e.g. {"das": "asd", "Mann": "man"}.
+
+    For every layout the following figures are computed:
+    - keystrokes_saved: letter keystrokes saved on the presented sentences by chording every word that has a chord
+    - ambiguity_hits: word occurrences whose own letter set is the chord of a different word
+    - collision_hits: key groups the participants actually pressed together (from the event logs) that the layout
+      would turn into a different word than the one they produced
+    - error_time: estimated ms lost per word to ambiguity and collision hits; every hit costs deleting the wrong
+      word and retyping the intended one by letters
+    - time_per_word: estimated ms per word including error_time; the time of a keystroke and the time of a chord
+      (depending on its number of keys) are fitted on the keystrokes and chords recorded in the trials. Layouts are
+      ranked by this figure
+
+    The recorded sessions are read from a segmented log (see segmented_log.py) if logs/index.csv exists,
+    otherwise from the per-user stats_user*.csv and events_user*.csv files.
+
+    usage: layout_evaluation.py [--random <number of layouts>] [--processes <n>] [<layout.json> ...]
+"""
+
+STATS_FILES = "stats_user*.csv"
+EVENT_FILES = "events_user*.csv"
+RANDOM_CHORD_SIZES = (2, 5)
+# number of random key sets tried for a word before it is left without a chord
+RANDOM_ATTEMPTS = 50
+
+# read-only data of the worker processes; set once per process by init_worker
+_corpus = None
+
+
+class Corpus(object):
+    """
+        Everything a layout is evaluated against; built once and shared with all worker processes
+
+        @param words: List of (lowercase word, number of occurrences) from the presented sentences
+        @param key_groups: List of (set of keys pressed together, lowercase word produced, number of occurrences)
+        @param timing: Dictionary returned by estimate_times
+    """
+
+    __slots__ = ("words", "key_groups", "timing", "letter_time", "chord_base", "chord_key_time", "letter_keystrokes",
+                 "word_count")
+
+    def __init__(self, words, key_groups, timing):
+        self.words = [(word, len(word), count, frozenset(word)) for word, count in words]
+        self.key_groups = key_groups
+        self.timing = timing
+        self.letter_time = timing["letter_time"]
+        self.chord_base = timing["chord_base"]
+        self.chord_key_time = timing["chord_key_time"]
+        self.letter_keystrokes = sum(length * count for _, length, count, _ in self.words)
+        self.word_count = sum(count for _, _, count, _ in self.words)
+
+    ''' Returns the estimated ms for a chord with the given number of keys '''
+
+    def chord_time(self, size):
+        return self.chord_base + self.chord_key_time * size
+
+    ''' Returns the estimated ms lost when a chord produces wrong instead of word '''
+
+    def error_time(self, wrong, word):
+        return self.letter_time * (len(wrong) + len(word))
+
+
+def split_words(sentence):
+    """
+        Splits a logged sentence into lowercase words
+    """
+    return [word for word in re.split(r"[\s.]+", sentence.lower()) if word]
+
+
+def chord_words(layout):
+    """
+        @return: The set of lowercase words a layout has a chord for
+    """
+    return set(word.lower() for word in layout.values())
+
+
+def recorded_trials(events):
+    """
+        Splits the key_pressed events of every user into trials; a trial ends with its sentence_typed event
+
+        @return: Dictionary user_id -> list of (number of single key presses, texts of the presses of several keys) for
+        every trial of the user in the order of the events
+    """
+    trials = {}
+    current = {}
+    for user_id, event_type, key, text, _ in events:
+        if event_type == "sentence_typed":
+            trials.setdefault(user_id, []).append(current.pop(user_id, (0, [])))
+        elif event_type == "key_pressed":
+            single, multi_key = current.setdefault(user_id, (0, []))
+            if key != "return" and len(text.strip()) > 1:
+                multi_key.append(text)
+            else:
+                # return is logged as the two characters "\\n"; empty texts (e.g. Shift) are no keystroke
+                current[user_id] = (single + (1 if key == "return" else len(text)), multi_key)
+    return trials
+
+
+def estimate_times(stats, trials, layout):
+    """
+        Fits the time of a keystroke on the standard input trials and the time of a chord on the chord trials
+
+        The stats of every user are matched with the recorded trials of the user in order. With chord input a press of
+        several keys is a chord if it produced a word of the recorded layout; other presses of several keys (failed
+        chords, or letters typed in quick succession, as always with standard input) count one keystroke per letter.
+        Chord trials are modelled as keystrokes * letter_time plus chord_base + chord_key_time * (number of keys) for
+        every chord; chord_base and chord_key_time are fitted by least squares over all chord trials. If chord_base
+        comes out negative it is fixed at 0 and chord_key_time is fitted alone; fitted_chord_base reports the value.
+
+        @param stats: StatsRecords of all users
+        @param trials: Recorded trials as returned by recorded_trials
+        @param layout: The layout that was used while recording
+        @return: Dictionary with letter_time, chord_base, chord_key_time (ms), fitted_chord_base (ms, None if all
+        chords had the same size), chords, multi_key_presses (presses of several keys that were no chord in the chord
+        trials), trials (matched with the events) and unmatched_trials
+        @raise ValueError: If no trials or chords were recorded or the chord trials do not fit the model
+    """
+    keys_of_word = dict((word.lower(), keys) for keys, word in layout.items())
+    trial_index = Counter()
+    standard_time = standard_keystrokes = 0
+    chord_trials = []
+    chords_pressed = multi_key_presses = unmatched = 0
+    for user_id, _, _, technique, total_time, _, _ in stats:
+        index = trial_index[user_id]
+        trial_index[user_id] += 1
+        user_trials = trials.get(user_id, [])
+        if index >= len(user_trials):
+            unmatched += 1
+            continue
+        keystrokes, multi_key = user_trials[index]
+        if technique == "S":
+            standard_time += total_time
+            standard_keystrokes += keystrokes + sum(len(text) for text in multi_key)
+        elif technique == "C":
+            chorded = chord_keys = 0
+            for text in multi_key:
+                keys = keys_of_word.get(text.lower())
+                if keys is not None:
+                    chorded += 1
+                    chord_keys += len(keys)
+                else:
+                    keystrokes += len(text)
+                    multi_key_presses += 1
+            chords_pressed += chorded
+            chord_trials.append((total_time, chorded, chord_keys, keystrokes))
+    if standard_keystrokes == 0 or chords_pressed == 0:
+        raise ValueError("No recorded keystrokes of standard input or no chords (%d of %d trials matched with the "
+                         "events)" % (len(stats) - unmatched, len(stats)))
+    letter_time = float(standard_time) / standard_keystrokes
+
+    # normal equations of chord time = chord_base * chorded + chord_key_time * chord_keys
+    nn = nk = kk = ny = ky = 0.0
+    for total_time, chorded, chord_keys, keystrokes in chord_trials:
+        chord_time = total_time - letter_time * keystrokes
+        nn += chorded * chorded
+        nk += chorded * chord_keys
+        kk += chord_keys * chord_keys
+        ny += chorded * chord_time
+        ky += chord_keys * chord_time
+    determinant = nn * kk - nk * nk
+    if abs(determinant) < 1e-9:
+        # all chords have the same size: a constant time per chord
+        fitted_chord_base = None
+        chord_base, chord_key_time = ny / nn, 0.0
+    else:
+        chord_key_time = (nn * ky - nk * ny) / determinant
+        chord_base = fitted_chord_base = (ny * kk - ky * nk) / determinant
+        if chord_base < 0:
+            # the best fit with chord_base >= 0 lies on chord_base = 0
+            chord_base, chord_key_time = 0.0, ky / kk
+    if chord_base < 0 or chord_key_time < 0:
+        raise ValueError("The chord trials do not fit the timing model: chord %.0f ms + %.0f ms per key"
+                         % (chord_base, chord_key_time))
+    return {"letter_time": letter_time, "chord_base": chord_base, "chord_key_time": chord_key_time,
+            "fitted_chord_base": fitted_chord_base, "chords": chords_pressed, "multi_key_presses": multi_key_presses,
+            "trials": len(stats) - unmatched, "unmatched_trials": unmatched}
+
+
+def recorded_key_groups(events, layout):
+    """
+        Reconstructs the sets of keys that were pressed together from the key_pressed events
+
+        The filter posts the produced word as the text of a single key press: for chords the keys are those of the
+        recorded layout, otherwise (failed chords, single letters) they are the letters of the text
+
+        @return: List of (frozenset of keys, lowercase word produced, number of occurrences)
+    """
+    keys_of_word = dict((word, keys) for keys, word in layout.items())
+    groups = Counter()
+    for _, event_type, _, text, _ in events:
+        if event_type != "key_pressed" or len(text.strip()) < 2:
+            continue
+        keys = keys_of_word.get(text, frozenset(text.lower()))
+        groups[(keys, text.lower())] += 1
+    return [(keys, word, count) for (keys, word), count in groups.items()]
+
+
+def load_corpus(stats_pattern=STATS_FILES, event_pattern=EVENT_FILES, layout=chords.CHORDS,
+                directory=segmented_log.DEFAULT_DIRECTORY):
+    """
+        Loads the phrase corpus, the recorded key groups and the timing model from the log files
+
+        @param layout: The layout that was used while recording
+        @param directory: Segmented log to read instead of the per-user files, if it has an index
+        @raise ValueError: If there are no recorded trials of both text input techniques or they do not fit the timing
+        model (see estimate_times)
+    """
+    strings = records.StringTable()
+    stats = records.StatsRecords(strings)
+    key_groups = []
+    trials = {}
+    if os.path.exists(os.path.join(directory, segmented_log.INDEX_FILE)):
+        source = directory
+        reader = segmented_log.SegmentedLogReader(directory)
+        for row in reader.read_rows("stats"):
+            stats.append(*stats.convert_row(row))
+        events = records.EventRecords(strings)
+        for row in reader.read_rows("events"):
+            events.append(*row)
+        key_groups.extend(recorded_key_groups(events, layout))
+        trials = recorded_trials(events)
+    else:
+        source = "%s and %s" % (stats_pattern, event_pattern)
+        for filename in sorted(glob.glob(stats_pattern)):
+            for row in records.StatsRecords.from_csv(filename, strings):
+                stats.append(*row)
+        for filename in sorted(glob.glob(event_pattern)):
+            events = records.EventRecords.from_csv(filename, strings)
+            key_groups.extend(recorded_key_groups(events, layout))
+            for user_id, user_trials in recorded_trials(events).items():
+                trials.setdefault(user_id, []).extend(user_trials)
+    techniques = set(stats.column("text_input_technique"))
+    if not {"C", "S"} <= techniques:
+        # the timing model needs both; without them every layout would get meaningless figures
+        raise ValueError("No recorded trials of both text input techniques in %s (found %d trials)"
+                         % (source, len(stats)))
+    words = Counter()
+    for sentence in stats.column("presented_sentence"):
+        words.update(split_words(sentence))
+    return Corpus(sorted(words.items()), key_groups, estimate_times(stats, trials, layout))
+
+
+def evaluate(layout, corpus):
+    """
+        Computes the figures for a single layout
+
+        @return: Dictionary with keystrokes_saved, keystrokes_saved_ratio, ambiguity_hits, collision_hits, error_time,
+        time_per_word
+    """
+    keys_of_word = dict((word.lower(), keys) for keys, word in layout.items())
+    word_of_keys = dict((keys, word.lower()) for keys, word in layout.items())
+    saved = ambiguity = 0
+    total_time = error_time = 0.0
+    for word, length, count, letters in corpus.words:
+        keys = keys_of_word.get(word)
+        if keys is not None:
+            saved += (length - 1) * count
+            total_time += corpus.chord_time(len(keys)) * count
+        else:
+            total_time += corpus.letter_time * length * count
+            wrong = word_of_keys.get(letters, word)
+            if wrong != word:
+                ambiguity += count
+                error_time += corpus.error_time(wrong, word) * count
+        total_time += corpus.letter_time * count  # space
+    collisions = 0
+    for keys, produced, count in corpus.key_groups:
+        chord_word = word_of_keys.get(keys)
+        if chord_word is not None and chord_word != produced:
+            collisions += count
+            error_time += corpus.error_time(chord_word, produced) * count
+    word_count = max(corpus.word_count, 1)
+    return {"keystrokes_saved": saved,
+            "keystrokes_saved_ratio": float(saved) / max(corpus.letter_keystrokes, 1),
+            "ambiguity_hits": ambiguity,
+            "collision_hits": collisions,
+            "error_time": error_time / word_count,
+            "time_per_word": (total_time + error_time) / word_count}
+
+
+def init_worker(corpus):
+    """
+        Stores the shared corpus in a worker process
+    """
+    global _corpus
+    _corpus = corpus
+
+
+def evaluate_named(named_layout):
+    """
+        Evaluates a (name, layout) tuple inside a worker process
+    """
+    name, layout = named_layout
+    return name, evaluate(layout, _corpus)
+
+
+def evaluate_all(named_layouts, corpus, processes=None, chunksize=16):
+    """
+        Evaluates many layouts in parallel; the corpus is handed to every worker process only once
+
+        @param named_layouts: List of (name, layout) tuples
+        @param processes: Number of worker processes; defaults to the number of cores
+        @return: List of (name, figures) sorted from best (lowest time per word) to worst
+    """
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(corpus,)) as pool:
+        results = pool.map(evaluate_named, named_layouts, chunksize)
+    return sorted(results, key=lambda result: (result[1]["time_per_word"], result[1]["collision_hits"]))
+
+
+def load_layout(filename):
+    """
+        Reads a layout file ({"word": "keys", ...})
+    """
+    with open(filename, encoding="utf-8") as layout_file:
+        return dict((frozenset(keys.lower()), word) for word, keys in json.load(layout_file).items())
+
+
+def save_layout(layout, filename):
+    """
+        Writes a layout in the format read by load_layout
+    """
+    with open(filename, "w", encoding="utf-8") as layout_file:
+        json.dump(dict((word, "".join(sorted(keys))) for keys, word in layout.items()), layout_file,
+                  ensure_ascii=False, indent=1)
+
+
+def random_layout(words, seed):
+    """
+        Creates a layout with a chord of random letters for every word; if a key set is taken already, other key sets
+        are tried, so only words that find no free key set within RANDOM_ATTEMPTS tries are left out
+
+        @param words: The words to create chords for
+        @param seed: Seed for the random generator; equal seeds give equal layouts
+    """
+    generator = random.Random(seed)
+    layout = {}
+    for word in words:
+        letters = sorted(set(word.lower()))
+        if len(letters) < RANDOM_CHORD_SIZES[0]:
+            continue
+        for _ in range(RANDOM_ATTEMPTS):
+            size = generator.randint(RANDOM_CHORD_SIZES[0], min(RANDOM_CHORD_SIZES[1], len(letters)))
+            keys = frozenset(generator.sample(letters, size))
+            if keys not in layout:
+                layout[keys] = word
+                break
+    return layout
+
+
+def main():
+    args = sys.argv[1:]
+    number_of_random = processes = 0
+    layout_files = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--random":
+            number_of_random = int(args.pop(0))
+        elif arg == "--processes":
+            processes = int(args.pop(0))
+        else:
+            layout_files.append(arg)
+
+    try:
+        corpus = load_corpus()
+    except ValueError as error:
+        sys.stderr.write("%s\n" % error)
+        sys.exit(1)
+    timing = corpus.timing
+    print("%d words, %d recorded key groups; letter %.0f ms, chord %.0f ms + %.0f ms per key"
+          % (corpus.word_count, len(corpus.key_groups), corpus.letter_time, corpus.chord_base, corpus.chord_key_time))
+    print("fitted on %d trials (%d without events left out): %d chords, %d presses of several keys without a chord"
+          % (timing["trials"], timing["unmatched_trials"], timing["chords"], timing["multi_key_presses"]))
+    if timing["fitted_chord_base"] is not None and timing["fitted_chord_base"] < 0:
+        sys.stderr.write("warning: the fitted time per chord independent of its size was %.0f ms; fixed at 0 ms\n"
+                         % timing["fitted_chord_base"])
+    vocabulary = sorted(set(chord_words(chords.CHORDS)) | set(word for word, _, _, _ in corpus.words))
+    named_layouts = [("recorded layout", chords.CHORDS), ("no chords", {})]
+    named_layouts += [(filename, load_layout(filename)) for filename in layout_files]
+    named_layouts += [("random %d" % seed, random_layout(vocabulary, seed)) for seed in range(number_of_random)]
+
+    started = time.time()
+    ranking = evaluate_all(named_layouts, corpus, processes or None)
+    print("ranked %d layouts in %.2f s" % (len(ranking), time.time() - started))
+    print("rank;layout;time_per_word (ms);error_time (ms);keystrokes_saved;saved_ratio;ambiguity_hits;collision_hits")
+    for rank, (name, figures) in enumerate(ranking[:20], 1):
+        print("%d;%s;%.1f;%.1f;%d;%.3f;%d;%d" % (rank, name, figures["time_per_word"], figures["error_time"],
+                                                  figures["keystrokes_saved"], figures["keystrokes_saved_ratio"],
+                                                  figures["ambiguity_hits"], figures["collision_hits"]))
+
+
+if __name__ == '__main__':
+    main()
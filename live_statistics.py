@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import json
+import math
+import time
+
+""" Streaming statistics of the running sessions
+
+    TestLogger.log_stats feeds every completed test trial into a LiveStatistics object. Mean and variance
+    are updated with Welford's algorithm, median and quartiles with the P-square algorithm (Jain & Chlamtac),
+    so each trial costs O(1) regardless of how many trials came before.
+
+    The figures per user and text input technique are written to a json snapshot file that is replaced
+    at most every few seconds; running this script shows the snapshot while the sessions go on.
+
+    usage: live_statistics.py [<snapshot file>]
+"""
+
+DEFAULT_SNAPSHOT = "live_statistics.json"
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+METRICS = ("wpm", "total_time (ms)", "error_rate (%)")
+
+
+class RunningStats(object):
+    """
+        Mean and variance of a stream of values using Welford's algorithm
+    """
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    ''' Adds a single value '''
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    ''' Returns the sample variance (0 for less than two values) '''
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+
+class P2Quantile(object):
+    """
+        Estimates a single quantile of a stream of values with five markers (P-square algorithm)
+
+        @param p: The quantile to estimate, e.g. 0.5 for the median
+    """
+
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    ''' Adds a single value '''
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    ''' Piecewise-parabolic prediction of the new height of marker i '''
+
+    def parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / float(n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    ''' Returns the current estimate (exact while there are less than five values) '''
+
+    def value(self):
+        heights = self.heights
+        if len(heights) == 0:
+            return float("nan")
+        if len(heights) < 5:
+            return heights[min(int(round(self.p * (len(heights) - 1))), len(heights) - 1)]
+        return heights[2]
+
+
+class StreamingSummary(object):
+    """
+        Running mean/variance plus a set of streaming quantiles for one metric
+    """
+
+    __slots__ = ("stats", "quantiles")
+
+    def __init__(self, quantiles=QUANTILES):
+        self.stats = RunningStats()
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def add(self, value):
+        self.stats.add(value)
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+    ''' Returns the current figures as a dictionary '''
+
+    def summary(self):
+        figures = {"n": self.stats.count, "mean": self.stats.mean, "sd": self.stats.stddev(),
+                   "min": self.stats.minimum, "max": self.stats.maximum}
+        for quantile in self.quantiles:
+            figures["p%d" % round(quantile.p * 100)] = quantile.value()
+        return figures
+
+
+class LiveStatistics(object):
+    """
+        Collects the figures of all completed trials per user and text input technique
+
+        @param snapshot_filename: File that receives the json snapshot; None disables writing
+        @param interval: Minimum number of seconds between two snapshots
+    """
+
+    def __init__(self, snapshot_filename=DEFAULT_SNAPSHOT, interval=2.0):
+        super(LiveStatistics, self).__init__()
+        self.snapshot_filename = snapshot_filename
+        self.interval = interval
+        self.groups = {}
+        self.last_snapshot = 0
+
+    ''' Adds a completed trial and rewrites the snapshot if the interval has passed
+
+        @param user_id: The user's id
+        @param technique: The text input technique of the trial
+        @param wpm: Words per minute ratio
+        @param total_time: The time needed to write the whole sentence (ms)
+        @param error_rate: Minimum string distance error rate in percent
+    '''
+
+    def add_trial(self, user_id, technique, wpm, total_time, error_rate):
+        for key in ((str(user_id), technique), ("all", technique)):
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = [StreamingSummary() for _ in METRICS]
+            for summary, value in zip(group, (wpm, total_time, error_rate)):
+                summary.add(value)
+        if self.snapshot_filename is not None and time.monotonic() - self.last_snapshot >= self.interval:
+            self.write_snapshot()
+
+    ''' Returns all figures as a nested dictionary: user -> technique -> metric -> figures '''
+
+    def snapshot(self):
+        users = {}
+        for (user_id, technique), group in sorted(self.groups.items()):
+            users.setdefault(user_id, {})[technique] = dict(
+                (metric, summary.summary()) for metric, summary in zip(METRICS, group))
+        return {"updated": time.strftime("%Y-%m-%dT%H:%M:%S"), "users": users}
+
+    ''' Atomically replaces the snapshot file so that readers never see half a file '''
+
+    def write_snapshot(self):
+        self.last_snapshot = time.monotonic()
+        temp_filename = self.snapshot_filename + ".tmp"
+        with open(temp_filename, "w", encoding="utf-8") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file, indent=1)
+        os.replace(temp_filename, self.snapshot_filename)
+
+
+def minimum_string_distance(a, b):
+    """
+        Levenshtein distance between the presented and the transcribed text
+
+        @return: Minimum number of insertions, deletions and substitutions turning a into b
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def error_rate(presented, transcribed):
+    """
+        MSD error rate in percent (Soukoreff & MacKenzie)
+    """
+    length = max(len(presented), len(transcribed))
+    if length == 0:
+        return 0.0
+    return 100.0 * minimum_string_distance(presented, transcribed) / length
+
+
+def print_snapshot(snapshot):
+    """
+        Prints a snapshot as a table with one line per user, technique and metric
+    """
+    print("updated: %s" % snapshot["updated"])
+    print("%-6s %-4s %-16s %5s %9s %9s %9s %9s %9s" % ("user", "tech", "metric", "n", "mean", "sd", "p25",
+                                                      "median", "p75"))
+    for user_id, techniques in snapshot["users"].items():
+        for technique, metrics in techniques.items():
+            for metric, figures in metrics.items():
+                print("%-6s %-4s %-16s %5d %9.2f %9.2f %9.2f %9.2f %9.2f" % (
+                    user_id, technique, metric, figures["n"], figures["mean"], figures["sd"], figures["p25"],
+                    figures["p50"], figures["p75"]))
+
+
+def main():
+    snapshot_filename = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SNAPSHOT
+    last_modified = None
+    try:
+        while True:
+            if os.path.exists(snapshot_filename) and os.path.getmtime(snapshot_filename) != last_modified:
+                last_modified = os.path.getmtime(snapshot_filename)
+                with open(snapshot_filename, encoding="utf-8") as snapshot_file:
+                    print_snapshot(json.load(snapshot_file))
+                print("")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import csv
+import glob
+import json
+import time
+import queue
+import shutil
+import socket
+import asyncio
+import threading
+
+""" Collects the log records of several lab workstations in one place
+
+    Every TestLogger with a collector address streams its stats, event and word records as
+    newline-delimited JSON to a LogCollector running somewhere on the local network:
+    {"stream": "stats", "record": {"user_id": "1", ...}}
+
+    The collector appends them to one "<stream>_data.csv" per stream (the same format as the
+    merged stats_data.csv/event_data.csv/word_data.csv used by statistics.py).
+
+    usage: log_collector.py [<output directory> [<port>]]
+           log_collector.py --simulate <number of clients> [<records per client>]
+"""
+
+DEFAULT_PORT = 5055
+STREAM_FILES = {"stats": "stats_data.csv", "events": "event_data.csv", "words": "word_data.csv"}
+# one spill file per workstation; records carry their user_id, so it is shared by all participants
+DEFAULT_SPILL_FILE = "spill_%s.jsonl" % socket.gethostname()
+# spill files (and interrupted replays) a new sink takes over on startup, e.g. left by a crashed session
+LEFTOVER_SPILL_PATTERNS = ["spill_*.jsonl.replay", "spill_*.jsonl"]
+
+
+class CollectorSink(object):
+    """
+        TestLogger sink that sends records to a LogCollector from a background thread
+
+        Records are queued without blocking the caller (the Qt event loop). If the queue is full or the
+        collector cannot be reached, records are appended to a local spill file instead; the sender thread
+        replays the spill file whenever it is connected and has nothing else to send, and once more on close.
+        Spill files left in the same directory by earlier sinks are taken over on startup and replayed as well.
+
+        @param host: Host name or address of the collector
+        @param port: Port of the collector
+        @param spill_filename: File receiving the records that could not be delivered; relative names are
+        resolved against the working directory at creation time
+        @param max_pending: Number of records that may wait for the sender thread
+        @param retry_interval: Seconds to wait before reconnecting after a failure
+        @param adopt_leftovers: Set to False if other sinks spill into the same directory at the same time
+    """
+
+    BATCH_SIZE = 200
+
+    def __init__(self, host, port, spill_filename=DEFAULT_SPILL_FILE, max_pending=10000, retry_interval=2.0,
+                 adopt_leftovers=True):
+        super(CollectorSink, self).__init__()
+        self.address = (host, int(port))
+        self.spill_filename = os.path.abspath(spill_filename)
+        # the spill file is renamed to this while it is replayed, so that write() can keep spilling meanwhile
+        self.replay_filename = self.spill_filename + ".replay"
+        self.retry_interval = retry_interval
+        self.pending = queue.Queue(max_pending)
+        self.spill_lock = threading.Lock()
+        self.spilled = 0  # number of records that went to the spill file
+        self.connection = None
+        self.next_connect = 0
+        if adopt_leftovers:
+            self.adopt_leftovers()
+        self.sender = threading.Thread(target=self.run, daemon=True)
+        self.sender.start()
+
+    ''' Queues a single record for sending
+
+        @param stream: Name of the record stream, one of STREAM_FILES ("stats", "events" or "words")
+        @param record: Dictionary with the logged values
+    '''
+
+    def write(self, stream, record):
+        line = json.dumps({"stream": stream, "record": record}, ensure_ascii=False) + "\n"
+        try:
+            self.pending.put_nowait(line)
+        except queue.Full:
+            self.spill([line])  # never block the caller; the collector is too slow or gone
+
+    ''' Appends the spill files of earlier sinks in the directory of the spill file to it (oldest data first) '''
+
+    def adopt_leftovers(self):
+        directory = os.path.dirname(self.spill_filename)
+        own = (self.spill_filename, self.replay_filename)
+        for pattern in LEFTOVER_SPILL_PATTERNS:
+            for filename in sorted(glob.glob(os.path.join(directory, pattern))):
+                if filename in own:
+                    continue
+                with open(filename, "rb") as leftover, open(self.spill_filename, "ab") as spill_file:
+                    shutil.copyfileobj(leftover, spill_file)
+                os.remove(filename)
+
+    ''' Sends all queued and spilled records and stops the sender thread
+
+        @param timeout: Seconds to wait for the sender; undelivered records stay in the spill file
+    '''
+
+    def close(self, timeout=5.0):
+        self.pending.put(None)
+        self.sender.join(timeout)
+
+    ''' Main loop of the sender thread '''
+
+    def run(self):
+        done = False
+        while not done:
+            try:
+                lines = [self.pending.get(timeout=self.retry_interval)]
+            except queue.Empty:
+                self.drain_spill()
+                continue
+            while len(lines) < self.BATCH_SIZE:
+                try:
+                    lines.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                done = True
+                lines = [line for line in lines if line is not None]
+            if len(lines) > 0:
+                self.send(lines)
+            if self.pending.empty():
+                self.drain_spill()
+        self.next_connect = 0  # last chance to deliver the spill file
+        self.drain_spill()
+        if self.connection is not None:
+            self.connection.close()
+
+    ''' Sends a batch of lines or spills them if that is not possible
+
+        @param lines: The encoded records
+    '''
+
+    def send(self, lines):
+        if not self.connect():
+            self.spill(lines)
+            return
+        try:
+            self.connection.sendall("".join(lines).encode("utf-8"))
+        except OSError:
+            self.disconnect()
+            self.spill(lines)
+
+    ''' Makes sure there is a connection and replays spilled records after reconnecting
+
+        @return: True if the collector is reachable
+    '''
+
+    def connect(self):
+        if self.connection is not None:
+            return True
+        if time.monotonic() < self.next_connect:
+            return False
+        try:
+            self.connection = socket.create_connection(self.address, timeout=self.retry_interval)
+        except OSError:
+            self.disconnect()
+            return False
+        return self.replay_spill()
+
+    ''' Replays the spill file if there is one and the collector is reachable '''
+
+    def drain_spill(self):
+        if not (os.path.exists(self.spill_filename) or os.path.exists(self.replay_filename)):
+            return
+        if self.connection is None:
+            self.connect()  # replays on success
+        else:
+            self.replay_spill()
+
+    ''' Drops the connection and waits retry_interval seconds before trying again '''
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self.next_connect = time.monotonic() + self.retry_interval
+
+    ''' Appends undeliverable lines to the spill file
+
+        @param lines: The encoded records
+    '''
+
+    def spill(self, lines):
+        with self.spill_lock:
+            with open(self.spill_filename, "a", encoding="utf-8") as spill_file:
+                spill_file.writelines(lines)
+            self.spilled += len(lines)
+
+    ''' Sends the content of the spill file over the connection and removes it
+
+        The file is moved aside first, so the lock is only held for the rename and write() never waits
+        for the network. A replay that broke off is finished before newer spilled records are sent; records spilled
+        during a replay are sent by the next one.
+
+        @return: False if the connection broke again; the records are kept for the next replay in that case
+    '''
+
+    def replay_spill(self):
+        with self.spill_lock:
+            if not os.path.exists(self.replay_filename):
+                if not os.path.exists(self.spill_filename):
+                    return True
+                os.replace(self.spill_filename, self.replay_filename)
+        try:
+            with open(self.replay_filename, "rb") as replay_file:
+                for chunk in iter(lambda: replay_file.read(1 << 16), b""):
+                    self.connection.sendall(chunk)
+        except OSError:
+            self.disconnect()
+            return False
+        os.remove(self.replay_filename)
+        return True
+
+
+class LogCollector(object):
+    """
+        asyncio server that ingests the records of many concurrent sessions into one store
+
+        Incoming lines go through a bounded queue; when the writer falls behind, the connection handlers
+        stop reading and TCP flow control slows the clients down.
+
+        @param directory: Directory receiving the merged csv files
+        @param batch_size: Maximum number of records written at once
+        @param max_pending: Number of records that may wait for the writer
+    """
+
+    def __init__(self, directory, batch_size=1000, max_pending=10000):
+        super(LogCollector, self).__init__()
+        self.directory = directory
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.writers = {}
+        self.files = []
+        self.records_written = 0
+        self.server = None
+        self.loop = None
+        self.started = threading.Event()
+
+    ''' Reads the lines of one client connection '''
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self.pending.put(line)
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # client gone or collector shutting down (Ctrl-C)
+        finally:
+            writer.close()
+
+    ''' Writes the queued records in batches '''
+
+    async def ingest(self):
+        while True:
+            lines = [await self.pending.get()]
+            while len(lines) < self.batch_size and not self.pending.empty():
+                lines.append(self.pending.get_nowait())
+            self.write_batch(lines)
+
+    ''' Decodes a batch of lines and appends the records to their csv files
+
+        @param lines: Raw lines received from the clients
+    '''
+
+    def write_batch(self, lines):
+        touched = set()
+        for line in lines:
+            try:
+                message = json.loads(line.decode("utf-8"))
+                stream, record = message["stream"], message["record"]
+            except (ValueError, KeyError, TypeError):
+                print("Dropping malformed record: %r" % line[:80])
+                continue
+            if stream not in STREAM_FILES:
+                print("Dropping record of unknown stream: %s" % stream)
+                continue
+            out = self.get_writer(stream, record)
+            out.writerow(record)
+            touched.add(stream)
+            self.records_written += 1
+        for stream in touched:
+            self.writers[stream][0].flush()
+
+    ''' Opens the csv file of a stream and writes the header if the file is new '''
+
+    def get_writer(self, stream, record):
+        if stream not in self.writers:
+            filename = os.path.join(self.directory, STREAM_FILES[stream])
+            is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+            logfile = open(filename, "a", encoding="utf-8", newline="")
+            out = csv.DictWriter(logfile, list(record.keys()), delimiter=";", quoting=csv.QUOTE_ALL,
+                                 extrasaction="ignore")
+            if is_new:
+                out.writeheader()
+            self.writers[stream] = (logfile, out)
+        return self.writers[stream][1]
+
+    ''' Accepts connections until stop() is called
+
+        @param host: Address to listen on
+        @param port: Port to listen on
+    '''
+
+    async def serve(self, host, port):
+        os.makedirs(self.directory, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.pending = asyncio.Queue(self.max_pending)
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        ingest_task = asyncio.ensure_future(self.ingest())
+        self.started.set()
+        try:
+            async with self.server:
+                await self.server.wait_closed()
+        finally:
+            ingest_task.cancel()
+            # the clients consider queued lines delivered; write them on stop() and on Ctrl-C alike
+            self.drain()
+            for logfile, _ in self.writers.values():
+                logfile.close()
+
+    ''' Writes everything that is still queued; ingest must not be running anymore '''
+
+    def drain(self):
+        while not self.pending.empty():
+            lines = []
+            while len(lines) < self.batch_size and not self.pending.empty():
+                lines.append(self.pending.get_nowait())
+            self.write_batch(lines)
+
+    ''' Stops the server; may be called from any thread '''
+
+    def stop(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+    ''' Runs the collector in the current thread '''
+
+    def run(self, host="0.0.0.0", port=DEFAULT_PORT):
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+
+
+def parse_address(address):
+    """
+        Splits a "host:port" string as used in the setup file
+
+        @return: Tuple of host and port
+    """
+    host, _, port = address.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def simulate(number_of_clients, records_per_client, directory="collected_simulation", port=DEFAULT_PORT):
+    """
+        Starts a collector and several simulated workstations on this machine and checks that every record arrived
+
+        @return: True if the collector stored all records
+    """
+    collector = LogCollector(directory)
+    server_thread = threading.Thread(target=collector.run, args=("127.0.0.1", port), daemon=True)
+    server_thread.start()
+    collector.started.wait()
+
+    def client(user_id):
+        sink = CollectorSink("127.0.0.1", port, os.path.join(directory, "spill_user%d.jsonl" % user_id),
+                             adopt_leftovers=False)
+        for i in range(records_per_client):
+            sink.write("events", {"user_id": user_id, "event_type": "key_pressed", "event_key": i,
+                                  "event_text": "a", "timestamp (ISO)": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        sink.close()
+
+    started = time.time()
+    clients = [threading.Thread(target=client, args=(i + 1,)) for i in range(number_of_clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    expected = number_of_clients * records_per_client
+    while collector.records_written < expected and time.time() - started < 30:
+        time.sleep(0.05)
+    collector.stop()
+    server_thread.join()
+    print("%d of %d records collected in %.2f s" % (collector.records_written, expected, time.time() - started))
+    return collector.records_written == expected
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--simulate":
+        records = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+        sys.exit(0 if simulate(int(sys.argv[2]), records) else 1)
+    directory = sys.argv[1] if len(sys.argv) > 1 else "collected"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+    print("Collecting logs on port %d into %s" % (port, directory))
+    LogCollector(directory).run(port=port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" The sentences presented in the training and the test trials """
+
+TRAINING_SENTENCES = ["der Mann ging im Herbst mal allein spazieren", "der Junge weiß echt nicht was er tut",
+                      "ich hab den Bus verpasst", "das Spiel ist gut schieß nen Punkt",
+                      "wir essen zu viel Fleisch iss Gemüse"]
+
+SENTENCES = ["der Mann ging im Herbst mal allein spazieren", "mein Hund hat dich extrem lieb",
+             "Die Leute mögen dich ich mag dich auch",
+             "der Junge weiß echt nicht was er tut", "ich hab den Bus verpasst", "leider hab ich keine Zeit",
+             "wo rennst du bloß rein", "es war ein Mann ich sehe ihn nicht.", "ich mag ein Eis es ist heiß hier",
+             "geh nun zum Auto es ist kalt hier", "der hat nen Hut aber ich nicht",
+             "das Spiel ist gut schieß nen Punkt", "wir essen zu viel Fleisch iss Gemüse"]
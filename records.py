@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import csv
+import array
+import tracemalloc
+
+""" Compact in-memory storage for logged trials and events
+
+    Instead of one dict per row, every column is a typed array. Strings (sentences, key texts,
+    event types, techniques) are stored once in a StringTable and referenced by their index.
+
+    TestLogger itself writes every row as a tuple with csv.writer and keeps nothing in memory; the record
+    lists are used by the analysis tools (e.g. layout_evaluation.py) that load whole log files.
+
+    usage: records.py [<number of events>]   (reports the memory of loaded events per 10k events; the
+                                              allocations of TestLogger.log_event are measured by benchmark.py)
+"""
+
+EVENT_FIELDS = ["user_id", "event_type", "event_key", "event_text", "timestamp (ISO)"]
+STATS_FIELDS = ["user_id", "presented_sentence", "transcribed_sentence", "text_input_technique",
+                "total_time (ms)", "wpm", "timestamp (ISO)"]
+WORD_FIELDS = ["user_id", "word", "text_input_technique", "input_type", "word_length", "chord_size",
+               "corrected", "word_time (ms)", "timestamp (ISO)"]
+
+
+class StringTable(object):
+    """
+        Interns strings and hands out small integer ids for them
+    """
+
+    __slots__ = ("ids", "strings")
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    ''' Returns the id of a string, adding it to the table if it is new '''
+
+    def get_id(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            string = sys.intern(string)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    ''' Returns the string stored for an id '''
+
+    def get_string(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class ColumnRecords(object):
+    """
+        Base class for array-backed record lists
+
+        Subclasses define FIELDS and, per field, an array typecode in TYPECODES; the typecode "s" marks
+        a string column that is stored as ids into the shared StringTable
+
+        @param strings: Optional StringTable shared with other record lists
+        @param capacity: Number of rows to preallocate
+    """
+
+    __slots__ = ("strings", "columns", "length")
+
+    FIELDS = []
+    TYPECODES = []
+
+    def __init__(self, strings=None, capacity=0):
+        self.strings = strings if strings is not None else StringTable()
+        self.columns = [array.array("l" if typecode == "s" else typecode, [0]) * capacity
+                        for typecode in self.TYPECODES]
+        self.length = 0
+
+    ''' Appends one row; values are given in the order of FIELDS '''
+
+    def append(self, *values):
+        if self.length == len(self.columns[0]):
+            self.grow()
+        for column, typecode, value in zip(self.columns, self.TYPECODES, values):
+            column[self.length] = self.strings.get_id(str(value)) if typecode == "s" else value
+        self.length += 1
+
+    ''' Doubles the preallocated space of all columns '''
+
+    def grow(self):
+        for column in self.columns:
+            column.extend(array.array(column.typecode, [0]) * max(len(column), 1024))
+
+    ''' Returns a single column as values (strings are resolved) '''
+
+    def column(self, field):
+        idx = self.FIELDS.index(field)
+        values = self.columns[idx][:self.length]
+        if self.TYPECODES[idx] == "s":
+            return [self.strings.get_string(value) for value in values]
+        return values
+
+    ''' Returns the row at position idx as a tuple '''
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError(idx)
+        return tuple(self.strings.get_string(column[idx]) if typecode == "s" else column[idx]
+                     for column, typecode in zip(self.columns, self.TYPECODES))
+
+    def __len__(self):
+        return self.length
+
+    ''' Reads a csv log file in the format written by TestLogger
+
+        @param filename: The csv file
+        @param strings: Optional StringTable shared with other record lists
+    '''
+
+    @classmethod
+    def from_csv(cls, filename, strings=None):
+        records = cls(strings)
+        with open(filename, newline="") as logfile:
+            reader = csv.reader(logfile, delimiter=";")
+            for row in reader:
+                if row[0] == "user_id":
+                    continue  # header; also repeated headers of re-opened files
+                records.append(*records.convert_row(row))
+        return records
+
+    ''' Converts a row of strings read from a csv file '''
+
+    def convert_row(self, row):
+        return row
+
+
+class EventRecords(ColumnRecords):
+    """
+        Keyboard events as logged by TestLogger.log_event; all columns are strings
+    """
+
+    __slots__ = ()
+
+    FIELDS = EVENT_FIELDS
+    TYPECODES = ["s", "s", "s", "s", "s"]
+
+
+class StatsRecords(ColumnRecords):
+    """
+        Trial statistics as logged by TestLogger.log_stats; times are stored as integers, wpm as double
+    """
+
+    __slots__ = ()
+
+    FIELDS = STATS_FIELDS
+    TYPECODES = ["s", "s", "s", "s", "l", "d", "s"]
+
+    def convert_row(self, row):
+        return row[:4] + [int(row[4]), float(row[5]), row[6]]
+
+
+class WordRecords(ColumnRecords):
+    """
+        Single words as logged by TestLogger.log_word; lengths, chord sizes, correction flags and times are stored
+        as integers
+    """
+
+    __slots__ = ()
+
+    FIELDS = WORD_FIELDS
+    TYPECODES = ["s", "s", "s", "s", "l", "l", "b", "l", "s"]
+
+    def convert_row(self, row):
+        return row[:4] + [int(row[4]), int(row[5]), int(row[6]), int(row[7]), row[8]]
+
+
+def measure_storage(number_of_events=10000):
+    """
+        Compares the memory needed by an analysis tool that loads events as one dict per row with EventRecords
+
+        @return: Tuple of bytes used per 10k events (dicts, records) and number of allocations
+    """
+    keys = ["a", "s", "d", "space", "return", "69", "65"]
+
+    def events():
+        for i in range(number_of_events):
+            key = keys[i % len(keys)]
+            # timestamps are rebuilt per event just like QDateTime.toString() does
+            yield ("1", "key_pressed", key, key * (i % 3 + 1), "2017-06-18T15:%02d:%02d" % (i // 60 % 60, i % 60))
+
+    tracemalloc.start()
+    dicts = []
+    for user_id, event_type, key, text, timestamp in events():
+        dicts.append({"user_id": user_id, "event_type": event_type, "event_key": key,
+                      "event_text": text, "timestamp (ISO)": timestamp})
+    dict_bytes, _ = tracemalloc.get_traced_memory()
+    dict_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    del dicts
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    records = EventRecords(capacity=number_of_events)
+    for event in events():
+        records.append(*event)
+    record_bytes, _ = tracemalloc.get_traced_memory()
+    record_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    scale = 10000.0 / number_of_events
+    return dict_bytes * scale, record_bytes * scale, dict_blocks * scale, record_blocks * scale
+
+
+def main():
+    number_of_events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    dict_bytes, record_bytes, dict_blocks, record_blocks = measure_storage(number_of_events)
+    print("loaded events per 10k: dicts %.0f KiB in %.0f blocks, records %.0f KiB in %.0f blocks"
+          % (dict_bytes / 1024, dict_blocks, record_bytes / 1024, record_blocks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import re
+import csv
+import gzip
+import lzma
+import shutil
+
+""" Segmented, compressed log files with an index
+
+    Instead of one ever-growing csv file per user, all records of a workstation go into numbered segments
+    per stream (e.g. stats_000001.csv). A segment is closed when it exceeds a size limit or when a session
+    ends; closed segments are compressed and get one line per (user, technique) in index.csv:
+
+    "segment";"stream";"user_id";"text_input_technique";"first_timestamp";"last_timestamp";"rows"
+
+    Readers use the index to open only the segments that can contain the requested rows.
+
+    usage: segmented_log.py <log directory> <stream> [<user_id> [<technique>]]   (prints the matching rows)
+"""
+
+# directory of the segmented log of the experiment and the analysis tools, relative to the working directory
+DEFAULT_DIRECTORY = "logs"
+INDEX_FILE = "index.csv"
+INDEX_FIELDS = ["segment", "stream", "user_id", "text_input_technique", "first_timestamp", "last_timestamp", "rows"]
+CODECS = {"gzip": (gzip.open, ".gz"), "lzma": (lzma.open, ".xz")}
+SEGMENT_PATTERN = re.compile(r"^(\w+)_(\d{6})\.csv$")
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+
+
+def open_segment(filename):
+    """
+        Opens a (possibly compressed) segment for reading text
+    """
+    for opener, extension in CODECS.values():
+        if filename.endswith(extension):
+            return opener(filename, "rt", encoding="utf-8", newline="")
+    return open(filename, encoding="utf-8", newline="")
+
+
+class SegmentedLogWriter(object):
+    """
+        Writes the records of several streams into size-limited segments and keeps the index up to date
+
+        @param directory: Directory for segments and index; created if missing
+        @param max_segment_bytes: A segment is closed once it grows beyond this size
+        @param codec: "gzip" or "lzma"; used to compress closed segments
+    """
+
+    def __init__(self, directory, max_segment_bytes=DEFAULT_SEGMENT_BYTES, codec="gzip"):
+        super(SegmentedLogWriter, self).__init__()
+        if codec not in CODECS:
+            raise ValueError("Unknown codec: %s (use one of %s)" % (codec, ", ".join(sorted(CODECS))))
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.codec = codec
+        self.open_segments = {}
+        os.makedirs(directory, exist_ok=True)
+        self.sequence = self.recover()
+
+    ''' Appends a single row to the current segment of a stream
+
+        @param stream: Name of the stream, e.g. "stats" or "events"
+        @param fields: The header of the stream; written at the start of every segment
+        @param row: The values in the order of fields
+        @param user_id: The user the row belongs to
+        @param technique: The text input technique the row belongs to
+        @param timestamp: ISO timestamp of the row
+    '''
+
+    def write(self, stream, fields, row, user_id, technique, timestamp):
+        segment = self.open_segments.get(stream)
+        if segment is None:
+            segment = self.open_segments[stream] = OpenSegment(self.next_filename(stream), stream, fields)
+        segment.write(row, user_id, technique, timestamp)
+        if segment.logfile.tell() >= self.max_segment_bytes:
+            self.close_segment(stream)
+
+    ''' Closes the current segments of all streams, e.g. at the end of a session '''
+
+    def roll(self):
+        for stream in list(self.open_segments):
+            self.close_segment(stream)
+
+    def close(self):
+        self.roll()
+
+    ''' Returns the file name for the next segment of a stream '''
+
+    def next_filename(self, stream):
+        self.sequence += 1
+        return os.path.join(self.directory, "%s_%06d.csv" % (stream, self.sequence))
+
+    ''' Closes, compresses and indexes the current segment of a stream '''
+
+    def close_segment(self, stream):
+        segment = self.open_segments.pop(stream)
+        segment.logfile.close()
+        self.compress(segment.filename, segment.stream, segment.groups)
+
+    ''' Compresses a plain segment, removes it and appends its groups to the index
+
+        @param groups: Dictionary (user_id, technique) -> [first timestamp, last timestamp, rows]
+    '''
+
+    def compress(self, filename, stream, groups):
+        opener, extension = CODECS[self.codec]
+        with open(filename, "rb") as plain, opener(filename + extension, "wb") as compressed:
+            shutil.copyfileobj(plain, compressed, 1 << 20)
+        os.remove(filename)
+        index_filename = os.path.join(self.directory, INDEX_FILE)
+        is_new = not os.path.exists(index_filename)
+        with open(index_filename, "a", encoding="utf-8", newline="") as index_file:
+            index_out = csv.writer(index_file, delimiter=";", quoting=csv.QUOTE_ALL)
+            if is_new:
+                index_out.writerow(INDEX_FIELDS)
+            for (user_id, technique), (first, last, rows) in sorted(groups.items()):
+                index_out.writerow([os.path.basename(filename) + extension, stream, user_id, technique,
+                                    first, last, rows])
+
+    ''' Finds the last used sequence number and closes segments left open by a crashed session
+
+        @return: The highest sequence number in the directory
+    '''
+
+    def recover(self):
+        sequence = 0
+        leftovers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name.split(".csv")[0] + ".csv")
+            if match is None:
+                continue
+            sequence = max(sequence, int(match.group(2)))
+            if name.endswith(".csv"):
+                leftovers.append((name, match.group(1)))
+        for name, stream in sorted(leftovers):
+            filename = os.path.join(self.directory, name)
+            self.compress(filename, stream, OpenSegment.scan(filename))
+        return sequence
+
+
+class OpenSegment(object):
+    """
+        The segment of a stream that is currently written; collects the index information on the way
+
+        @param filename: File name of the plain segment
+        @param stream: Name of the stream
+        @param fields: Header of the stream
+    """
+
+    __slots__ = ("filename", "stream", "logfile", "out", "groups")
+
+    def __init__(self, filename, stream, fields):
+        self.filename = filename
+        self.stream = stream
+        self.logfile = open(filename, "w", encoding="utf-8", newline="")
+        self.out = csv.writer(self.logfile, delimiter=";", quoting=csv.QUOTE_ALL)
+        self.out.writerow(fields)
+        self.groups = {}
+
+    def write(self, row, user_id, technique, timestamp):
+        self.out.writerow(row)
+        group = self.groups.get((str(user_id), technique))
+        if group is None:
+            self.groups[(str(user_id), technique)] = [timestamp, timestamp, 1]
+        else:
+            group[1] = timestamp
+            group[2] += 1
+
+    ''' Rebuilds the index information of a plain segment that was not closed properly
+
+        Rows of streams without a technique column are indexed with an empty technique
+    '''
+
+    @staticmethod
+    def scan(filename):
+        groups = {}
+        with open(filename, encoding="utf-8", newline="") as logfile:
+            reader = csv.reader(logfile, delimiter=";")
+            fields = next(reader, [])
+            technique_column = fields.index("text_input_technique") if "text_input_technique" in fields else None
+            for row in reader:
+                if len(row) != len(fields):
+                    continue  # a partially written last line
+                technique = row[technique_column] if technique_column is not None else ""
+                group = groups.get((row[0], technique))
+                if group is None:
+                    groups[(row[0], technique)] = [row[-1], row[-1], 1]
+                else:
+                    group[1] = row[-1]
+                    group[2] += 1
+        return groups
+
+
+class SegmentedLogReader(object):
+    """
+        Reads rows from a segmented log, opening only the segments the index marks as relevant
+
+        @param directory: Directory written by a SegmentedLogWriter
+    """
+
+    def __init__(self, directory):
+        super(SegmentedLogReader, self).__init__()
+        self.directory = directory
+        self.index = []
+        index_filename = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_filename):
+            with open(index_filename, encoding="utf-8", newline="") as index_file:
+                for entry in csv.DictReader(index_file, delimiter=";"):
+                    entry["rows"] = int(entry["rows"])
+                    self.index.append(entry)
+
+    ''' Returns the segments of a stream that may contain matching rows, in the order they were written
+
+        @param stream: Name of the stream
+        @param users: Optional collection of user ids (numbers or strings)
+        @param techniques: Optional collection of techniques; rows indexed without a technique always match
+        @param start: Optional ISO timestamp; segments ending before it are skipped
+        @param end: Optional ISO timestamp; segments starting after it are skipped
+    '''
+
+    def segments(self, stream, users=None, techniques=None, start=None, end=None):
+        users = set(str(user) for user in users) if users is not None else None
+        selected = []
+        for entry in self.index:
+            if entry["stream"] != stream or entry["segment"] in selected:
+                continue
+            if not self.matches(entry["user_id"], entry["text_input_technique"], users, techniques):
+                continue
+            if (start is not None and entry["last_timestamp"] < start) or \
+                    (end is not None and entry["first_timestamp"] > end):
+                continue
+            selected.append(entry["segment"])
+        return selected
+
+    ''' Yields the rows of a stream (as lists of strings) that match the given filters
+
+        Segments that are still being written (not in the index yet) are not read
+    '''
+
+    def read_rows(self, stream, users=None, techniques=None, start=None, end=None):
+        users = set(str(user) for user in users) if users is not None else None
+        for segment in self.segments(stream, users, techniques, start, end):
+            with open_segment(os.path.join(self.directory, segment)) as logfile:
+                reader = csv.reader(logfile, delimiter=";")
+                fields = next(reader)
+                technique_column = fields.index("text_input_technique") if "text_input_technique" in fields \
+                    else None
+                for row in reader:
+                    technique = row[technique_column] if technique_column is not None else ""
+                    if not self.matches(row[0], technique, users, techniques):
+                        continue
+                    if (start is not None and row[-1] < start) or (end is not None and row[-1] > end):
+                        continue
+                    yield row
+
+    ''' Returns the header of a stream as stored in its segments '''
+
+    def fields(self, stream):
+        for entry in self.index:
+            if entry["stream"] == stream:
+                with open_segment(os.path.join(self.directory, entry["segment"])) as logfile:
+                    return next(csv.reader(logfile, delimiter=";"))
+        return []
+
+    @staticmethod
+    def matches(user_id, technique, users, techniques):
+        if users is not None and user_id not in users:
+            return False
+        if techniques is not None and technique != "" and technique not in techniques:
+            return False
+        return True
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.stderr.write("Usage: %s <log directory> <stream> [<user_id> [<technique>]]\n" % sys.argv[0])
+        sys.exit(1)
+    reader = SegmentedLogReader(sys.argv[1])
+    users = [sys.argv[3]] if len(sys.argv) > 3 else None
+    techniques = [sys.argv[4]] if len(sys.argv) > 4 else None
+    out = csv.writer(sys.stdout, delimiter=";", quoting=csv.QUOTE_ALL)
+    out.writerow(reader.fields(sys.argv[2]))
+    for row in reader.read_rows(sys.argv[2], users, techniques):
+        out.writerow(row)
+
+
+if __name__ == '__main__':
+    main()
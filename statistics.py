@@ -1,19 +1,121 @@
+import os
+import glob
 import matplotlib
 import pandas
 import pylab as pl
 from scipy.stats import ttest_ind
 
-try:
-    # import the data
-    data = pandas.read_csv('stats_data.csv', delimiter=';')
+import records
+import segmented_log
+
+# trial statistics merged by log_collector.py (or by hand)
+STATS_DATA_FILE = 'stats_data.csv'
+STATS_COLUMNS = ['user_id', 'presented_sentence', 'transcribed_sentence', 'text_input_technique', 'total_time (ms)',
+                 'wpm', 'timestamp (ISO)']
+STATS_DTYPES = {'user_id': str, 'presented_sentence': str, 'transcribed_sentence': str, 'text_input_technique': str,
+                'total_time (ms)': 'int64', 'wpm': 'float64', 'timestamp (ISO)': str}
+# word-level records (see TestLogger.log_word): merged by log_collector.py or one file per user
+WORD_DATA_FILE = 'word_data.csv'
+WORD_USER_FILES = 'words_user*.csv'
+WORD_TIME = 'word_time (ms)'
+WORD_DTYPES = {'user_id': str, 'word': str, 'text_input_technique': str, 'input_type': str, 'word_length': 'int32',
+               'chord_size': 'int32', 'corrected': 'int8', WORD_TIME: 'int64'}
+
+
+# reads whole csv files into one data frame; every file is parsed by pandas in one go (gzip/lzma segments are
+# decompressed on the fly), so no python object is created per row
+def read_csv_files(filenames, columns, dtype=None):
+    frames = [pandas.read_csv(filename, delimiter=';', dtype=dtype) for filename in filenames]
+    if len(frames) == 0:
+        return pandas.DataFrame(columns=columns)
+    return pandas.concat(frames, ignore_index=True)
+
+
+# returns the segments of a stream of a segmented log; only the segments listed in the index for the given
+# techniques are opened
+def segmented_files(directory, stream, techniques=None):
+    reader = segmented_log.SegmentedLogReader(directory)
+    return [os.path.join(directory, segment) for segment in reader.segments(stream, techniques=techniques)]
+
+
+# reads the stats of all trials from a segmented log (used if it has an index) or from the merged stats_data.csv
+def read_stats_data(directory=segmented_log.DEFAULT_DIRECTORY, data_file=STATS_DATA_FILE, techniques=('C', 'S')):
+    if os.path.exists(os.path.join(directory, segmented_log.INDEX_FILE)):
+        filenames = segmented_files(directory, 'stats', techniques)
+    else:
+        filenames = [data_file]
+    data = read_csv_files(filenames, records.STATS_FIELDS, STATS_DTYPES)
+    data = data[data['text_input_technique'].isin(techniques)]
     # select only the relevant columns
-    data = data[['user_id', 'presented_sentence', 'transcribed_sentence', 'text_input_technique', 'total_time (ms)',
-                 'wpm', 'timestamp (ISO)']]
-except Exception:
-    print("Error! Maybe you need to install pandas!")
+    return data[STATS_COLUMNS]
+
+
+# splits the trials into chord input and standard input
+def split_by_technique(data):
+    return data[data['text_input_technique'] == 'C'], data[data['text_input_technique'] == 'S']
+
+
+# medians and means of the wpm of both techniques and the p-value of their difference
+def summarize_wpm(data):
+    data_chord_input, data_standard_input = split_by_technique(data)
+    chord_wpm, standard_wpm = data_chord_input['wpm'], data_standard_input['wpm']
+    return {'median_chord': pl.median(chord_wpm), 'median_standard': pl.median(standard_wpm),
+            'mean_chord': pl.mean(chord_wpm), 'mean_standard': pl.mean(standard_wpm),
+            'p_value': calculate_p_value(chord_wpm, standard_wpm)}
+
+
+# reads the word records from a segmented log, the collector's word_data.csv or the per-user files
+def read_word_data(directory=segmented_log.DEFAULT_DIRECTORY, techniques=None, data_file=WORD_DATA_FILE,
+                   user_files=WORD_USER_FILES):
+    if os.path.exists(os.path.join(directory, segmented_log.INDEX_FILE)):
+        filenames = segmented_files(directory, 'words', techniques)
+    elif os.path.exists(data_file):
+        filenames = [data_file]
+    else:
+        filenames = sorted(glob.glob(user_files))
+    words = read_csv_files(filenames, records.WORD_FIELDS, WORD_DTYPES)
+    if techniques is not None:
+        words = words[words['text_input_technique'].isin(techniques)]
+    # the few distinct strings of these columns are stored once
+    for column in ['text_input_technique', 'input_type']:
+        words[column] = words[column].astype('category')
+    return words
+
+
+# selects the words that were written without backspace; corrections would distort the time per word length
+def uncorrected_words(words):
+    return words[(words[WORD_TIME] > 0) & (words['corrected'] == 0)]
+
+
+# summarizes the word times of uncorrected words by input type and word length and by chord size (chorded words
+# only); all figures are computed with grouped, vectorized operations over the whole data frame
+def summarize_word_times(words):
+    words = uncorrected_words(words)
+    figures = ['count', 'median', 'mean']
+    by_length = words.groupby(['text_input_technique', 'input_type', 'word_length'], observed=True)[WORD_TIME] \
+        .agg(figures)
+    chorded = words[words['chord_size'] > 0]
+    by_chord_size = chorded.groupby('chord_size', observed=True)[WORD_TIME].agg(figures)
+    by_chord_size['ms_per_letter'] = (chorded[WORD_TIME] / chorded['word_length']) \
+        .groupby(chorded['chord_size']).median()
+    return by_length, by_chord_size
+
+
+# fits word time = intercept + slope * word length of the uncorrected words for every input type (least squares)
+def fit_word_times(words):
+    fits = {}
+    for input_type, group in uncorrected_words(words).groupby('input_type', observed=True):
+        if group['word_length'].nunique() > 1:
+            slope, intercept = pl.polyfit(group['word_length'].values, group[WORD_TIME].values, 1)
+            fits[input_type] = (intercept, slope, len(group))
+    return fits
+
+
+# the complete word-level analysis: time per word versus word length and chord size across all users
+def analyze_word_times(words):
+    by_length, by_chord_size = summarize_word_times(words)
+    return by_length, by_chord_size, fit_word_times(words)
 
-data_chord_input = data[data['text_input_technique'] == 'C']
-data_standard_input = data[data['text_input_technique'] == 'S']
 
 # constant strings
 MOVEMENT_TIME = 'movement_time (ms)'
@@ -99,19 +201,6 @@ def print_mean(data, label):
     print("Mean " + str(label) + ": " + str(pl.mean(data)))
 
 
-# data for the scatterplots that will be nested in one figure
-scatterplots_data = [ScatterPlotData(data_chord_input['wpm'], CIRCLE_MARKER, RED, "Chord Input"),
-                     ScatterPlotData(data_standard_input['wpm'], CIRCLE_MARKER, BLUE, "Standard Input")]
-
-# create a scatterplot to show the error rates for both pointing techniques when using very small targets
-create_new_scatterplot_figure(scatterplots_data,
-                              LabelData('Text Input performance regarding words per minute (wpm)',
-                                        TRIAL_ID, 'wpm'))
-
-print_median(data_chord_input['wpm'], 'Chord Input')
-print_median(data_standard_input['wpm'], 'Standard Input')
-
-
 # this method creates a boxplot with its title and x-/y-labels
 def create_boxplot(label, data, title, xlabel, ylabel):
     pl.boxplot(data, labels=label, showmeans=True)
@@ -120,24 +209,74 @@ def create_boxplot(label, data, title, xlabel, ylabel):
     pl.ylabel(ylabel)
 
 
-# label the boxplot elements, get data and create a boxplot with the given data
-label = ['Chord Input', 'Standard Input']
-boxplot_data = [data_chord_input['wpm'], data_standard_input['wpm']]
-create_boxplot(label, boxplot_data, 'Task performance', 'text input technique', 'wpm')
-
-# print out medians and means of absolute pointing performance
-print_median(data_chord_input['wpm'], "Chord Input")
-print_median(data_standard_input['wpm'], "Standard Input")
-print_mean(data_chord_input['wpm'], "Input")
-print_mean(data_standard_input['wpm'], "Standard")
-
-
 # calculates the p-value of a t-test given two samples
 def calculate_p_value(UV1, UV2):
     _, p_value = ttest_ind(UV1, UV2)
     return p_value
 
 
-# print out p-values of relative and absolute task performance
-print("p-value Text entry performance: " + str(calculate_p_value(data_chord_input['wpm'],
-                                                                 data_standard_input['wpm'])))
+# prints the word-level analysis and plots the median word time per word length for both input types
+def show_word_analysis(word_data):
+    if len(word_data) == 0:
+        print("No word records found (words_user*.csv, " + WORD_DATA_FILE + " or a segmented log)")
+        return
+    word_times_by_length, word_times_by_chord_size, fits = analyze_word_times(word_data)
+    print("Corrected words (excluded below): " + str(int(word_data['corrected'].sum())) + " of " +
+          str(len(word_data)))
+    print("Word time (ms) by text input technique, input type and word length:")
+    print(word_times_by_length.to_string())
+    print("Word time (ms) of chorded words by chord size:")
+    print(word_times_by_chord_size.to_string())
+    for input_type, (intercept, slope, count) in sorted(fits.items()):
+        print("Word time " + input_type + ": " + str(round(intercept, 1)) + " ms + " + str(round(slope, 1)) +
+              " ms per letter (n = " + str(count) + ")")
+
+    for input_type, color in [('chord', RED), ('letters', BLUE)]:
+        medians = uncorrected_words(word_data)
+        medians = medians[medians['input_type'] == input_type].groupby('word_length')[WORD_TIME].median()
+        create_scatter_plot(medians.index, medians.values, 'Word time versus word length', 'word length',
+                            'median word time (ms)', color, CIRCLE_MARKER)
+    pl.show()
+
+
+def main():
+    try:
+        # import the data
+        data = read_stats_data()
+    except Exception:
+        print("Error! Maybe you need to install pandas!")
+        return
+    data_chord_input, data_standard_input = split_by_technique(data)
+
+    # data for the scatterplots that will be nested in one figure
+    scatterplots_data = [ScatterPlotData(data_chord_input['wpm'], CIRCLE_MARKER, RED, "Chord Input"),
+                         ScatterPlotData(data_standard_input['wpm'], CIRCLE_MARKER, BLUE, "Standard Input")]
+
+    # create a scatterplot to show the error rates for both pointing techniques when using very small targets
+    create_new_scatterplot_figure(scatterplots_data,
+                                  LabelData('Text Input performance regarding words per minute (wpm)',
+                                            TRIAL_ID, 'wpm'))
+
+    summary = summarize_wpm(data)
+    print("Median Chord Input: " + str(summary['median_chord']))
+    print("Median Standard Input: " + str(summary['median_standard']))
+
+    # label the boxplot elements, get data and create a boxplot with the given data
+    label = ['Chord Input', 'Standard Input']
+    boxplot_data = [data_chord_input['wpm'], data_standard_input['wpm']]
+    create_boxplot(label, boxplot_data, 'Task performance', 'text input technique', 'wpm')
+
+    # print out medians and means of absolute pointing performance
+    print("Median Chord Input: " + str(summary['median_chord']))
+    print("Median Standard Input: " + str(summary['median_standard']))
+    print("Mean Input: " + str(summary['mean_chord']))
+    print("Mean Standard: " + str(summary['mean_standard']))
+
+    # print out p-values of relative and absolute task performance
+    print("p-value Text entry performance: " + str(summary['p_value']))
+
+    show_word_analysis(read_word_data(techniques=['C', 'S']))
+
+
+if __name__ == '__main__':
+    main()
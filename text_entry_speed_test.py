@@ -10,6 +10,7 @@ except ImportError:
     print("Could not import PyQt!")
 import re
 import csv
+import array
 import random
 
 try:
@@ -17,6 +18,36 @@ try:
 except ImportError:
     print("Could not import text_input_technique.py!")
 
+try:
+    import chords
+except ImportError:
+    print("Could not import chords.py!")
+
+try:
+    import log_collector
+except ImportError:
+    print("Could not import log_collector.py!")
+
+try:
+    import phrases
+except ImportError:
+    print("Could not import phrases.py!")
+
+try:
+    import records
+except ImportError:
+    print("Could not import records.py!")
+
+try:
+    import live_statistics
+except ImportError:
+    print("Could not import live_statistics.py!")
+
+try:
+    import segmented_log
+except ImportError:
+    print("Could not import segmented_log.py!")
+
 # This script was created by Alexander Frummet and Marco Batzdorf
 # and is based on the "textedit.py" script
 
@@ -24,6 +55,25 @@ except ImportError:
 [experiment_setup]
 UserID = 1
 Conditions = S;C
+
+    batch manifest format; every section starting with "participant" is run back-to-back in one process:
+[participant_1]
+UserID = 1
+Conditions = S;C
+
+[participant_2]
+UserID = 2
+Conditions = C;S
+
+    both formats may additionally stream all logs to a log_collector.py instance on the local network:
+[collector]
+Address = 192.168.0.10:5055
+
+    and/or write segmented, compressed logs with an index instead of stats_userN.csv/events_userN.csv:
+[segmented_log]
+Directory = logs
+MaxSegmentBytes = 4194304
+Codec = gzip
 """
 
 
@@ -35,14 +85,24 @@ class TextTest(QtWidgets.QTextEdit):
         @param conditions: A list with conditions for the tests that are to run
         @param isTraining:
         @param repetitions: Defines how often the test is repeated for a single condition
+        @param resources: Optional SessionResources shared between sessions (input techniques and loggers)
+        @param onFinished: Optional callback that is invoked once all trials are done
     """
 
-    def __init__(self, userId, conditions, repetitions=2):
+    def __init__(self, userId, conditions, repetitions=2, resources=None, onFinished=None):
         super(TextTest, self).__init__()
+        self.resources = resources if resources is not None else SessionResources()
+        self.onFinished = onFinished
         self.elapsed = 0
-        self.wordTimes = []
+        # word times of the current sentence in ms; text is collected in parts and only joined when needed
+        self.wordTimes = array.array("l")
+        self.textParts = []
+        self.wordParts = []
+        # how the current word was entered: number of chords, keys of the last chord, number of letter inputs
+        self.wordChords = 0
+        self.wordChordSize = 0
+        self.wordLetters = 0
         self.currentText = ""
-        self.currentWord = ""
         self.currentInputTechnique = None
         self.startNext = False
         self.isFirstLetter = True
@@ -64,7 +124,7 @@ class TextTest(QtWidgets.QTextEdit):
         self.trials = Trial.create_list_from_conditions(conditions, repetitions)
         self.currentTrial = self.trials[0]
         self.setInputTechnique(self.currentTrial.get_text_input_technique())
-        self.logger = TestLogger(userId, True, True)
+        self.logger = self.resources.get_logger(userId, True, True)
 
     ''' Set up the UI settings and show it to the user'''
 
@@ -88,8 +148,13 @@ class TextTest(QtWidgets.QTextEdit):
                 self.setInputTechnique(self.currentTrial.get_text_input_technique())
                 return
             self.currentTrial = newTrial
+            self.logger.technique = self.currentTrial.get_text_input_technique()
             self.isFirstLetter = True
             self.currentText = ""
+            del self.textParts[:]
+            del self.wordParts[:]
+            del self.wordTimes[:]
+            self.resetWordInput()
             self.setText("\n" + self.currentTrial.get_text())
             self.elapsed += 1
         else:
@@ -100,6 +165,8 @@ class TextTest(QtWidgets.QTextEdit):
     def endTest(self):
         self.logger.log_event("test_finished", "return", "Test finished! All trials done!")
         sys.stderr.write("All trials done!")
+        if self.onFinished is not None:
+            self.onFinished()
         self.deleteLater()
 
     ''' Shows the instructions for corresponding condition '''
@@ -118,12 +185,8 @@ class TextTest(QtWidgets.QTextEdit):
 
     def setInputTechnique(self, identifier):
         self.removeEventFilter(self.currentInputTechnique)
-        if identifier == Trial.INPUT_CHORD:
-            self.currentInputTechnique = input_technique.ChordInputMethod()
-            self.installEventFilter(self.currentInputTechnique)
-        else:
-            self.currentInputTechnique = input_technique.StandardInputMethod()
-            self.installEventFilter(self.currentInputTechnique)
+        self.currentInputTechnique = self.resources.get_input_technique(identifier)
+        self.installEventFilter(self.currentInputTechnique)
         return
 
     ''' Handles key press events received from the input filter '''
@@ -136,8 +199,9 @@ class TextTest(QtWidgets.QTextEdit):
             return
         self.logger.log_event("key_pressed", ev.key(), ev.text())
         super(TextTest, self).keyPressEvent(ev)
-        self.currentText += ev.text()
-        self.currentWord += ev.text()
+        self.textParts.append(ev.text())
+        self.wordParts.append(ev.text())
+        self.countWordInput(ev)
         if self.isFirstLetter:
             self.startSentenceTimeMeasurement()
             self.startWordTimeMeasurement()
@@ -145,21 +209,83 @@ class TextTest(QtWidgets.QTextEdit):
 
         if ev.key() == QtCore.Qt.Key_Space:
             wordTime = self.stopWordTimeMeasurement()
-            self.logger.log_event("word_typed", ev.key(), self.currentWord)
-            self.currentWord = ""
+            self.logger.log_event("word_typed", ev.key(), "".join(self.wordParts))
+            self.logWord(wordTime)
+            del self.wordParts[:]
             self.wordTimes.append(wordTime)
             self.startWordTimeMeasurement()
 
         if ev.key() == QtCore.Qt.Key_Return:
             wordTime = self.stopWordTimeMeasurement()
             self.sentenceTime = self.stopSentenceTimeMeasurement()
-            self.logger.log_event("word_typed", ev.key(), self.currentWord)
+            self.currentText = "".join(self.textParts)
+            self.logger.log_event("word_typed", ev.key(), "".join(self.wordParts))
             self.logger.log_event("sentence_typed", ev.key(), self.currentText)
-            self.currentWord = ""
+            self.logWord(wordTime)
+            del self.wordParts[:]
             self.wordTimes.append(wordTime)
             self.logger.log_stats(self.currentTrial, self.currentText, self.sentenceTime, self.calculateWpm())
             self.prepareNextTrial()
 
+    ''' Counts how a key press received from the input filter contributes to the current word
+
+        Texts of more than one letter that are a word of the chord layout count as a chord (only with chord input);
+        other texts, including failed chords, count as letters. Empty texts (e.g. Shift) and backspaces are not
+        counted; backspaces mark the word as corrected in logWord
+    '''
+
+    def countWordInput(self, ev):
+        if ev.key() in (QtCore.Qt.Key_Space, QtCore.Qt.Key_Return) or ev.text() == "" or "\b" in ev.text():
+            return
+        keys = chords.KEYS_OF_WORD.get(ev.text())
+        if self.currentTrial.get_text_input_technique() == Trial.INPUT_CHORD and keys is not None and \
+                len(ev.text()) > 1:
+            self.wordChords += 1
+            self.wordChordSize = len(keys)
+        else:
+            self.wordLetters += 1
+
+    ''' Forgets how the current word was entered '''
+
+    def resetWordInput(self):
+        self.wordChords = 0
+        self.wordChordSize = 0
+        self.wordLetters = 0
+
+    ''' Logs the word that was just completed with space or return; empty words (e.g. double spaces) are skipped
+
+        @param wordTime: The time needed to write the word
+    '''
+
+    def logWord(self, wordTime):
+        typed = "".join(self.wordParts)
+        word = self.applyBackspaces(typed).strip()
+        if word:
+            if self.wordChords == 1 and self.wordLetters == 0:
+                inputType = TestLogger.WORD_CHORD
+            elif self.wordChords == 0:
+                inputType = TestLogger.WORD_LETTERS
+            else:
+                inputType = TestLogger.WORD_MIXED
+            self.logger.log_word(word, self.currentTrial.get_text_input_technique(), inputType,
+                                 self.wordChordSize, "\b" in typed, wordTime)
+        self.resetWordInput()
+
+    ''' Returns the text that remains when the backspaces in it are applied, like the text field does
+
+        @param typed: The texts of the key presses of a word, joined
+    '''
+
+    @staticmethod
+    def applyBackspaces(typed):
+        chars = []
+        for char in typed:
+            if char != "\b":
+                chars.append(char)
+            elif chars:
+                chars.pop()
+        return "".join(chars)
+
     ''' Calculates the amount of words per minute on the basis of the written sentence'''
 
     def calculateWpm(self):
@@ -212,10 +338,11 @@ class TextTraining(TextTest):
         @param trainingInputTechnique: Defines which input technique should be used for training
         @param testToStartAfter: Tells the training which actual test to start afterwards
         @param repetitions: Defines how often the training is repeated for a single condition
+        @param resources: Optional SessionResources shared between sessions (input techniques and loggers)
     """
 
-    def __init__(self, userId, trainingInputTechnique, testToStartAfter=None, repetitions=3):
-        super(TextTraining, self).__init__(userId, trainingInputTechnique, repetitions)
+    def __init__(self, userId, trainingInputTechnique, testToStartAfter=None, repetitions=3, resources=None):
+        super(TextTraining, self).__init__(userId, trainingInputTechnique, repetitions, resources)
         self.testToStart = testToStartAfter
         if self.testToStart is not None:
             self.testToStart.hide()
@@ -232,7 +359,7 @@ class TextTraining(TextTest):
         self.trials = Trial.get_training_set(trainingInputTechnique, repetitions)
         self.currentTrial = self.trials[0]
         self.setInputTechnique(self.currentTrial.get_text_input_technique())
-        self.logger = TestLogger(userId, False, False)
+        self.logger = self.resources.get_logger(userId, False, False)
 
     ''' Shows the instructions for the current training session '''
 
@@ -260,38 +387,65 @@ class TestLogger(object):
         identification
         @param log_to_stdout: Set to True if you want to output the logs to stdout
         @param log_to_file: Set to True if all lines should be written to a csv-file
+        @param collector: Optional log_collector.CollectorSink all lines are streamed to; shared, not closed by the
+        logger
+        @param live_stats: Optional live_statistics.LiveStatistics that receives every logged trial
+        @param segments: Optional segmented_log.SegmentedLogWriter used instead of the per-user csv-files
     """
 
-    def __init__(self, user_id, log_to_stdout, log_to_file):
+    # input types of a logged word: a single chord, letters only or a mix of both (e.g. a corrected chord)
+    WORD_CHORD = "chord"
+    WORD_LETTERS = "letters"
+    WORD_MIXED = "mixed"
+
+    def __init__(self, user_id, log_to_stdout, log_to_file, collector=None, live_stats=None, segments=None):
         super(TestLogger, self).__init__()
         self.log_to_stdout = log_to_stdout
         self.log_to_file = log_to_file
         self.user_id = user_id
-        if log_to_file:
+        self.live_stats = live_stats
+        self.segments = segments
+        self.technique = ""  # technique of the current trial; used to index event rows
+        self.collector = collector
+        if log_to_file and segments is None:
             self.init_logging_to_file()
 
     ''' Creates necessary files for logging and writes appropriate header information '''
 
     def init_logging_to_file(self):
         self.stats_logfile = open("stats_user" + str(self.user_id) + ".csv", "a")
-        self.stats_out = csv.DictWriter(self.stats_logfile,
-                                        ["user_id", "presented_sentence", "transcribed_sentence",
-                                         "text_input_technique",
-                                         "total_time (ms)", "wpm", "timestamp (ISO)"], delimiter=";",
-                                        quoting=csv.QUOTE_ALL)
+        # rows are written as plain tuples in the order of records.STATS_FIELDS/records.EVENT_FIELDS
+        self.stats_out = csv.writer(self.stats_logfile, delimiter=";", quoting=csv.QUOTE_ALL)
         self.events_logfile = open("events_user" + str(self.user_id) + ".csv", "a")
-        self.events_out = csv.DictWriter(self.events_logfile,
-                                         ["user_id", "event_type", "event_key", "event_text", "timestamp (ISO)"],
-                                         delimiter=";",
-                                         quoting=csv.QUOTE_ALL)
-
-        self.stats_out.writeheader()
-        self.events_out.writeheader()
+        self.events_out = csv.writer(self.events_logfile, delimiter=";", quoting=csv.QUOTE_ALL)
+        self.words_logfile = open("words_user" + str(self.user_id) + ".csv", "a")
+        self.words_out = csv.writer(self.words_logfile, delimiter=";", quoting=csv.QUOTE_ALL)
+
+        # files are opened in append mode; only new files get a header
+        if self.stats_logfile.tell() == 0:
+            self.stats_out.writerow(records.STATS_FIELDS)
+        if self.events_logfile.tell() == 0:
+            self.events_out.writerow(records.EVENT_FIELDS)
+        if self.words_logfile.tell() == 0:
+            self.words_out.writerow(records.WORD_FIELDS)
         print("Fields for stats logging: "
               "\"user_id\";\"presented_sentence\";\"transcribed_sentence\";\"text_input_technique\";"
               "\"total_time\";\"wpm\";\"timestamp (ISO)\"")
         print("Fields for event logging: "
               "\"user_id\";\"event_type\";\"event_key\";\"event_text\";\"timestamp (ISO)\"")
+        print("Fields for word logging: "
+              "\"user_id\";\"word\";\"text_input_technique\";\"input_type\";\"word_length\";\"chord_size\";"
+              "\"corrected\";\"word_time (ms)\";\"timestamp (ISO)\"")
+
+    ''' Flushes and closes the csv files; the logger must not be used afterwards '''
+
+    def close(self):
+        if self.log_to_file and self.segments is None:
+            self.stats_logfile.close()
+            self.events_logfile.close()
+            self.words_logfile.close()
+            self.log_to_file = False
+        self.collector = None
 
     ''' Logs input statistics for a single trial
 
@@ -304,20 +458,53 @@ class TestLogger(object):
     def log_stats(self, trial, transcribed_text, time_needed, wpm):
         transcribed_text = re.sub('\s\s', ' ', transcribed_text)
         transcribed_text = re.sub('\n', '', transcribed_text)
-        log_line = "\"%s\";\"%s\";\"%s\";\"%s\";\"%d\";\"%f\";\"%s\"" % (
-            self.user_id, trial.get_text(), trial.get_text_input_technique(),
-            transcribed_text.strip(), time_needed,
-            wpm, self.timestamp())
+        timestamp = self.timestamp()
         if self.log_to_stdout:
+            log_line = "\"%s\";\"%s\";\"%s\";\"%s\";\"%d\";\"%f\";\"%s\"" % (
+                self.user_id, trial.get_text(), transcribed_text.strip(),
+                trial.get_text_input_technique(), time_needed,
+                wpm, timestamp)
             print(log_line)
 
-        current_values = {"user_id": self.user_id, "presented_sentence": trial.get_text(),
-                          "transcribed_sentence": transcribed_text.strip(),
-                          "text_input_technique": trial.get_text_input_technique(),
-                          "total_time (ms)": time_needed,
-                          "wpm": wpm, "timestamp (ISO)": self.timestamp()}
-        if self.log_to_file:
+        current_values = (self.user_id, trial.get_text(), transcribed_text.strip(), trial.get_text_input_technique(),
+                          time_needed, wpm, timestamp)
+        if self.segments is not None:
+            self.segments.write("stats", records.STATS_FIELDS, current_values, self.user_id,
+                                trial.get_text_input_technique(), timestamp)
+        elif self.log_to_file:
             self.stats_out.writerow(current_values)
+        if self.collector is not None:
+            self.collector.write("stats", dict(zip(records.STATS_FIELDS, current_values)))
+        if self.live_stats is not None:
+            self.live_stats.add_trial(self.user_id, trial.get_text_input_technique(), wpm, time_needed,
+                                      live_statistics.error_rate(trial.get_text(), transcribed_text.strip()))
+        return
+
+    ''' Logs a single word of a trial
+
+        @param word: The word as typed by the user
+        @param technique: The text input technique of the trial
+        @param input_type: WORD_CHORD, WORD_LETTERS or WORD_MIXED
+        @param chord_size: Number of keys of the chord used for the word; 0 if no chord was used
+        @param corrected: True if backspace was used while writing the word
+        @param time_needed: The time needed to write the word
+    '''
+
+    def log_word(self, word, technique, input_type, chord_size, corrected, time_needed):
+        timestamp = self.timestamp()
+        if self.log_to_stdout:
+            log_line = "\"%s\";\"%s\";\"%s\";\"%s\";\"%d\";\"%d\";\"%d\";\"%d\";\"%s\"" % (
+                self.user_id, word, technique, input_type, len(word), chord_size, corrected, time_needed, timestamp)
+            print(log_line)
+
+        current_values = (self.user_id, word, technique, input_type, len(word), chord_size, int(corrected),
+                          time_needed, timestamp)
+        if self.segments is not None:
+            self.segments.write("words", records.WORD_FIELDS, current_values, self.user_id, technique, timestamp)
+        elif self.log_to_file:
+            self.words_out.writerow(current_values)
+        if self.collector is not None:
+            self.collector.write("words", dict(zip(records.WORD_FIELDS, current_values)))
         return
 
     ''' Logs a keyboard event like pressing/releasing a button
@@ -336,14 +523,18 @@ class TestLogger(object):
             key = "space"
             text = " "
 
-        log_line = "\"%s\";\"%s\";\"%s\";\"%s\";\"%s\"" % (self.user_id, type, key, text.strip(), self.timestamp())
+        timestamp = self.timestamp()
         if self.log_to_stdout:
+            log_line = "\"%s\";\"%s\";\"%s\";\"%s\";\"%s\"" % (self.user_id, type, key, text.strip(), timestamp)
             print(log_line)
 
-        current_values = {"user_id": self.user_id, "event_type": type, "event_key": key,
-                          "event_text": text, "timestamp (ISO)": self.timestamp()}
-        if self.log_to_file:
+        current_values = (self.user_id, type, key, text, timestamp)
+        if self.segments is not None:
+            self.segments.write("events", records.EVENT_FIELDS, current_values, self.user_id, self.technique, timestamp)
+        elif self.log_to_file:
             self.events_out.writerow(current_values)
+        if self.collector is not None:
+            self.collector.write("events", dict(zip(records.EVENT_FIELDS, current_values)))
         return
 
     ''' Returns a timestamp'''
@@ -361,16 +552,11 @@ class Trial:
         @param text: The sentence the user has to type to complete this trial
     """
 
-    TRAINING_SENTENCES = ["der Mann ging im Herbst mal allein spazieren", "der Junge weiß echt nicht was er tut",
-                          "ich hab den Bus verpasst", "das Spiel ist gut schieß nen Punkt",
-                          "wir essen zu viel Fleisch iss Gemüse"]
+    __slots__ = ("text_input_technique", "text")
+
+    TRAINING_SENTENCES = phrases.TRAINING_SENTENCES
 
-    SENTENCES = ["der Mann ging im Herbst mal allein spazieren", "mein Hund hat dich extrem lieb",
-                 "Die Leute mögen dich ich mag dich auch",
-                 "der Junge weiß echt nicht was er tut", "ich hab den Bus verpasst", "leider hab ich keine Zeit",
-                 "wo rennst du bloß rein", "es war ein Mann ich sehe ihn nicht.", "ich mag ein Eis es ist heiß hier",
-                 "geh nun zum Auto es ist kalt hier", "der hat nen Hut aber ich nicht",
-                 "das Spiel ist gut schieß nen Punkt", "wir essen zu viel Fleisch iss Gemüse"]
+    SENTENCES = phrases.SENTENCES
 
     INPUT_CHORD = "C"
     INPUT_STANDARD = "S"
@@ -390,27 +576,31 @@ class Trial:
     @staticmethod
     def create_list_from_conditions(conditions, repetitions):
         trials = []
-        Trial.SENTENCES = repetitions * Trial.SENTENCES
+        # work on a copy so that the shared corpus is not multiplied again by every new session
+        sentences = repetitions * Trial.SENTENCES
 
         for i in range(len(conditions)):
-            random.shuffle(Trial.SENTENCES)
-            for j in range(len(Trial.SENTENCES)):
-                trials.append(Trial(conditions[i], Trial.get_sentence_from_list(len(trials))))
+            random.shuffle(sentences)
+            for j in range(len(sentences)):
+                trials.append(Trial(conditions[i], Trial.get_sentence_from_list(len(trials), sentences)))
         return trials
 
     ''' Helper for getting a single sentence from the SENTENCES list
 
         @param idx: The index of the sentence we want
+        @param sentences: The list to pick from; defaults to the SENTENCES list
 
         @return: The sentence at position idx in the SENTENCES list
     '''
 
     @staticmethod
-    def get_sentence_from_list(idx):
-        if idx < len(Trial.SENTENCES):
-            return Trial.SENTENCES[idx]
+    def get_sentence_from_list(idx, sentences=None):
+        if sentences is None:
+            sentences = Trial.SENTENCES
+        if idx < len(sentences):
+            return sentences[idx]
         else:
-            return Trial.SENTENCES[len(Trial.SENTENCES) - 1 - idx]
+            return sentences[len(sentences) - 1 - idx]
 
     ''' Get the text the user has to write for this trial'''
 
@@ -433,12 +623,139 @@ class Trial:
     @staticmethod
     def get_training_set(input_technique, repetitions):
         training_trials = []
-        Trial.TRAINING_SENTENCES = repetitions * Trial.TRAINING_SENTENCES
-        for i in range(len(Trial.TRAINING_SENTENCES)):
-            training_trials.append(Trial(input_technique, Trial.TRAINING_SENTENCES[i]))
+        training_sentences = repetitions * Trial.TRAINING_SENTENCES
+        for i in range(len(training_sentences)):
+            training_trials.append(Trial(input_technique, training_sentences[i]))
         return training_trials
 
 
+class SessionResources(object):
+    """
+        Holds everything that can be shared between consecutive sessions in one process:
+        the input technique filters (and with them the chord index) and the loggers per user
+
+        Sessions only ask for resources through this object so that a batch run does not pay
+        the setup cost for every participant
+
+        @param collector_address: Optional (host, port) of a log collector; one sink (and spill file) for this
+        workstation is shared by all file loggers
+        @param live_stats: Optional live_statistics.LiveStatistics fed by all file loggers
+        @param segments: Optional segmented_log.SegmentedLogWriter shared by all file loggers
+    """
+
+    def __init__(self, collector_address=None, live_stats=None, segments=None):
+        super(SessionResources, self).__init__()
+        self.collector = None
+        if collector_address is not None:
+            host, port = collector_address
+            self.collector = log_collector.CollectorSink(host, port)
+        self.live_stats = live_stats
+        self.segments = segments
+        self.input_techniques = {}
+        self.loggers = {}
+
+    ''' Returns the (shared) input filter for an input technique identifier
+
+        @param identifier: Trial.INPUT_CHORD or Trial.INPUT_STANDARD
+    '''
+
+    def get_input_technique(self, identifier):
+        if identifier not in self.input_techniques:
+            if identifier == Trial.INPUT_CHORD:
+                self.input_techniques[identifier] = input_technique.ChordInputMethod()
+            else:
+                self.input_techniques[identifier] = input_technique.StandardInputMethod()
+        return self.input_techniques[identifier]
+
+    ''' Returns the logger for a user, opening its files only on first use
+
+        @param user_id: The user's id
+        @param log_to_stdout: Set to True if you want to output the logs to stdout
+        @param log_to_file: Set to True if all lines should be written to a csv-file
+    '''
+
+    def get_logger(self, user_id, log_to_stdout, log_to_file):
+        key = (str(user_id), log_to_stdout, log_to_file)
+        if key not in self.loggers:
+            if log_to_file:
+                self.loggers[key] = TestLogger(user_id, log_to_stdout, log_to_file, self.collector,
+                                               self.live_stats, self.segments)
+            else:
+                self.loggers[key] = TestLogger(user_id, log_to_stdout, log_to_file)
+        return self.loggers[key]
+
+    ''' Clears all per-session state so that the next participant starts from scratch '''
+
+    def reset(self):
+        for technique in self.input_techniques.values():
+            technique.reset()
+
+    ''' Closes all loggers of a user once their session is over; also closes the current log segments
+
+        @param user_id: The user's id
+    '''
+
+    def release_user(self, user_id):
+        for key in [key for key in self.loggers if key[0] == str(user_id)]:
+            self.loggers.pop(key).close()
+        if self.segments is not None:
+            self.segments.roll()
+        if self.live_stats is not None and self.live_stats.snapshot_filename is not None:
+            self.live_stats.write_snapshot()
+
+    ''' Closes the shared sinks once all sessions are over; the collector sink delivers what is left '''
+
+    def close(self):
+        for key in list(self.loggers):
+            self.loggers.pop(key).close()
+        if self.collector is not None:
+            self.collector.close()
+            self.collector = None
+        if self.segments is not None:
+            self.segments.close()
+
+
+class SessionRunner(object):
+    """
+        Runs the sessions (training followed by test) of several participants back-to-back
+        inside a single QApplication
+
+        @param sessions: A list of (user_id, conditions) tuples, e.g. from parse_manifest_file
+        @param resources: Optional SessionResources; a new one is created if omitted
+    """
+
+    def __init__(self, sessions, resources=None):
+        super(SessionRunner, self).__init__()
+        self.sessions = sessions
+        self.resources = resources if resources is not None else SessionResources()
+        self.currentSession = -1
+        self.currentUserId = None
+
+    ''' Starts the first session '''
+
+    def start(self):
+        self.startNextSession()
+
+    ''' Starts training and test for the next participant or quits the application if everyone is done '''
+
+    def startNextSession(self):
+        self.currentSession += 1
+        if self.currentSession >= len(self.sessions):
+            self.resources.close()
+            QtWidgets.QApplication.instance().quit()
+            return
+        self.currentUserId, conditions = self.sessions[self.currentSession]
+        self.resources.reset()
+        test = TextTest(self.currentUserId, conditions, resources=self.resources, onFinished=self.onSessionFinished)
+        self.training = TextTraining(self.currentUserId, Trial.INPUT_CHORD, test, resources=self.resources)
+
+    ''' Called by the test once a participant completed all trials '''
+
+    def onSessionFinished(self):
+        self.resources.release_user(self.currentUserId)
+        self.startNextSession()
+
+
 def main():
     try:
         app = QtWidgets.QApplication(sys.argv)
@@ -446,8 +763,12 @@ def main():
             sys.stderr.write("Usage: %s <setup file>\n" % sys.argv[0])
             sys.exit(1)
         if sys.argv[1].endswith('.ini'):
-            user_id, conditions = parse_ini_file(sys.argv[1])
-        text_training = TextTraining(user_id, "C", TextTest(user_id, conditions))
+            sessions = parse_manifest_file(sys.argv[1])
+            collector_address = parse_collector_address(sys.argv[1])
+            segments = parse_segmented_log(sys.argv[1])
+        live_stats = live_statistics.LiveStatistics()
+        runner = SessionRunner(sessions, SessionResources(collector_address, live_stats, segments))
+        runner.start()
         sys.exit(app.exec_())
     except Exception:
         print("An error occured!")
@@ -474,5 +795,55 @@ def parse_ini_file(filename):
     return user_id, conditions
 
 
+def parse_manifest_file(filename):
+    """
+        Reads all participants from a batch manifest; a plain setup file yields a single session
+
+        @return: A list of (user_id, conditions) tuples in the order they appear in the file
+    """
+    config = configparser.ConfigParser()
+    config.read(filename)
+    if 'experiment_setup' in config:
+        return [parse_ini_file(filename)]
+    sessions = []
+    for section in config.sections():
+        if section.startswith('participant'):
+            setup = config[section]
+            sessions.append((setup['UserID'], setup['Conditions'].split(";")))
+    if len(sessions) == 0:
+        print("Error: wrong file format.")
+        sys.exit(1)
+    return sessions
+
+
+def parse_collector_address(filename):
+    """
+        Reads the optional [collector] section of a setup or manifest file
+
+        @return: Tuple of host and port or None if logs should not be streamed
+    """
+    config = configparser.ConfigParser()
+    config.read(filename)
+    if 'collector' in config and 'Address' in config['collector']:
+        return log_collector.parse_address(config['collector']['Address'])
+    return None
+
+
+def parse_segmented_log(filename):
+    """
+        Reads the optional [segmented_log] section of a setup or manifest file
+
+        @return: A segmented_log.SegmentedLogWriter or None if the per-user csv-files should be used
+    """
+    config = configparser.ConfigParser()
+    config.read(filename)
+    if 'segmented_log' not in config:
+        return None
+    setup = config['segmented_log']
+    return segmented_log.SegmentedLogWriter(setup.get('Directory', segmented_log.DEFAULT_DIRECTORY),
+                                            setup.getint('MaxSegmentBytes', segmented_log.DEFAULT_SEGMENT_BYTES),
+                                            setup.get('Codec', 'gzip'))
+
+
 if __name__ == '__main__':
     main()
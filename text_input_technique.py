@@ -5,6 +5,8 @@ import sys
 from PyQt5 import Qt, QtGui, QtCore, QtWidgets
 import re
 
+import chords
+
 
 class StandardInputMethod(QtCore.QObject):
     """
@@ -19,6 +21,11 @@ class StandardInputMethod(QtCore.QObject):
         super(StandardInputMethod, self).__init__()
         self.keys = []
 
+    ''' Forgets all collected keys; used when the filter is reused for another session'''
+
+    def reset(self):
+        self.keys = []
+
     ''' Helper for getting the currently typed word'''
 
     def get_word(self):
@@ -67,79 +74,7 @@ class ChordInputMethod(StandardInputMethod):
     """
 
     ''' The chord list defining all mappings between multiple keyboard buttons and a single word'''
-    CHORDS = {
-        frozenset(["a", "s", "d"]): "das",
-        frozenset(["w", "s", "a"]): "was",
-        frozenset(["m", "a", "n"]): "Mann",
-        frozenset(["l", "ä", "u", "f", "t"]): "läuft",
-        frozenset(["s", "e"]): "es",
-        frozenset(["w", "r", "a"]): "war",
-        frozenset(["i", "e", "n"]): "ein",
-        frozenset(["i", "c", "h"]): "ich",
-        frozenset(["m", "g", "a"]): "mag",
-        frozenset(["e", "d", "n"]): "den",
-        frozenset(["i", "e", "s"]): "Eis",
-        frozenset(["g", "e", "h"]): "Geh",
-        frozenset(["n", "u"]): "nun",
-        frozenset(["z", "u", "m"]): "zum",
-        frozenset(["a", "u", "t", "o"]): "Auto",
-        frozenset(["n", "i", "h", "c", "t"]): "nicht",
-        frozenset(["s", "e", "h"]): "sehe",
-        frozenset(["d", "i", "c", "h"]): "dich",
-        frozenset(["w", "o"]): "wo",
-        frozenset(["r", "e", "n", "s", "t"]): "rennst",
-        frozenset(["d", "u"]): "du",
-        frozenset(["r", "i", "n", "e"]): "rein",
-        frozenset(["d", "e", "r"]): "der",
-        frozenset(["j", "u", "n", "g", "e"]): "Junge",
-        frozenset(["w", "e", "i", "ß"]): "weiß",
-        frozenset(["e", "r"]): "er",
-        frozenset(["t", "u"]): "tut",
-        frozenset(["r", "s", "i", "z", "e", "a", "p", "n"]): "spazieren",
-        frozenset(["n", "i", "g"]): "ging",
-        frozenset(["m", "l", "a"]): "mal",
-        frozenset(["l", "e", "t", "u"]): "Leute",
-        frozenset(["m", "ö", "g", "e", "n"]): "mögen",
-        frozenset(["d", "i", "c", "h"]): "dich",
-        frozenset(["h", "u", "n", "d"]): "Hund",
-        frozenset(["h", "a", "t"]): "hat",
-        frozenset(["l", "i", "e", "b"]): "lieb",
-        frozenset(["m", "e", "i", "n"]): "mein",
-        frozenset(["i", "s", "t"]): "ist",
-        frozenset(["h", "e", "i", "ß"]): "heiß",
-        frozenset(["h", "i", "e", "r"]): "hier",
-        frozenset(["s", "p", "i", "e", "l"]): "Spiel",
-        frozenset(["g", "u", "t"]): "gut",
-        frozenset(["w", "i", "r"]): "wir",
-        frozenset(["e", "s", "n"]): "essen",
-        frozenset(["z", "u"]): "zu",
-        frozenset(["v", "i", "e", "l"]): "viel",
-        frozenset(["s", "c", "h", "i", "e", "ß"]): "schieß",
-        frozenset(["n", "u", "p", "k", "t"]): "Punkt",
-        frozenset(["b", "u", "s"]): "Bus",
-        frozenset(["v", "e", "r", "p", "a", "s", "t"]): "verpasst",
-        frozenset(["l", "e", "i", "d", "r"]): "leider",
-        frozenset(["h", "a", "b"]): "hab",
-        frozenset(["z", "e", "i", "t"]): "Zeit",
-        frozenset(["k", "i", "e", "n"]): "keine",
-        frozenset(["k", "a", "l", "t"]): "kalt",
-        frozenset(["i", "h", "n"]): "ihn",
-        frozenset(["a", "u", "c", "h"]): "auch",
-        frozenset(["a", "b", "e", "r"]): "aber",
-        frozenset(["i", "s"]): "iss",
-        frozenset(["g", "e", "m", "ü", "s"]): "Gemüse",
-        frozenset(["h", "e", "r", "b", "s", "t"]): "Herbst",
-        frozenset(["a", "l", "i", "e", "n"]): "allein",
-        frozenset(["e", "x", "r", "t", "m"]): "extrem",
-        frozenset(["e", "c", "h", "t"]): "echt",
-        frozenset(["e", "m", "n"]): "Termin",
-        frozenset(["i", "m"]): "im",
-        frozenset(["f", "l", "e", "i", "s", "c", "h"]): "Fleisch",
-        frozenset(["n", "e"]): "nen",
-        frozenset(["d", "i", "e"]): "die",
-        frozenset(["h", "u", "t"]): "Hut",
-        frozenset(["b", "l", "o", "ß"]): "bloß",
-    }
+    CHORDS = chords.CHORDS
 
     def __init__(self):
         super(ChordInputMethod, self).__init__()